@@ -1,2 +1,3 @@
 # from . import controllers
-from . import models
\ No newline at end of file
+from . import models
+from . import cli
\ No newline at end of file
@@ -18,9 +18,12 @@
     'data': [
         'security/auth_user_token_security.xml',
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         'views/sync_app_config_views.xml',
         'views/auth_user_token_views.xml',
         'views/webhook_log_views.xml',
+        'views/webhook_replay_views.xml',
+        'views/webhook_stats_views.xml',
         'views/auth_user_token_menu.xml',
     ],
     'installable': True,
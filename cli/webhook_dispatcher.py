@@ -0,0 +1,78 @@
+# cli/webhook_dispatcher.py
+import argparse
+import logging
+import signal
+import sys
+import threading
+from pathlib import Path
+
+from odoo.cli import Command
+
+_logger = logging.getLogger(__name__)
+
+
+class WebhookDispatcher(Command):
+    """Deliver webhooks from a dedicated process"""
+    name = 'webhook_dispatcher'
+
+    def run(self, cmdargs):
+        """
+        Usage: odoo-bin webhook_dispatcher -c odoo.conf -d DB [--poll-interval 2]
+
+        Claims due webhook logs of the database and sends them with the
+        dispatcher thread pool of this process, independently of the HTTP
+        workers. Several instances can run side by side: rows are claimed
+        with SKIP LOCKED. On SIGTERM/SIGINT it stops claiming, lets the
+        queued webhooks finish for up to ``--drain-timeout`` seconds and
+        puts the rest back to pending.
+        """
+        import odoo
+        from odoo import api, SUPERUSER_ID
+        from odoo.modules.registry import Registry
+        from ..models.cus_models import _get_webhook_config, shutdown_webhook_dispatcher
+
+        parser = argparse.ArgumentParser(
+            prog=f'{Path(sys.argv[0]).name} {self.name}',
+            description=self.__doc__,
+        )
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait when nothing is due (default: 2)')
+        parser.add_argument('--claim-size', type=int, default=500,
+                            help='Rows claimed per transaction (default: 500)')
+        parser.add_argument('--drain-timeout', type=float, default=30.0,
+                            help='Seconds to wait for queued webhooks on shutdown (default: 30)')
+        opts, odoo_args = parser.parse_known_args(cmdargs)
+
+        odoo.tools.config.parse_config(odoo_args)
+        db_name = odoo.tools.config['db_name']
+        if not db_name or ',' in db_name:
+            sys.exit("webhook_dispatcher needs exactly one database (-d)")
+
+        stop = threading.Event()
+
+        def request_stop(signum, _frame):
+            _logger.info(f"Received signal {signum}, stopping webhook dispatcher")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        _logger.info(f"Webhook dispatcher started on database {db_name}")
+        while not stop.is_set():
+            dispatched = 0
+            try:
+                # Pick up configuration changes made by other processes
+                registry = Registry(db_name).check_signaling()
+                config = _get_webhook_config()
+                if config:
+                    with registry.cursor() as cr:
+                        env = api.Environment(cr, SUPERUSER_ID, {})
+                        dispatched = env['webhook.log']._dispatch_due(config, opts.claim_size)
+            except Exception:
+                _logger.exception("Webhook dispatcher loop failed")
+            # Keep claiming while full batches fit, otherwise let the workers catch up
+            if dispatched < opts.claim_size:
+                stop.wait(opts.poll_interval)
+
+        shutdown_webhook_dispatcher(opts.drain_timeout)
+        _logger.info("Webhook dispatcher stopped")
@@ -1,8 +1,18 @@
 from . import sync_app_config
 from . import auth_user_token
+from . import auth_token_revocation
+from . import auth_user_token_session
+from . import api_rate_limit
 from . import sync_update
+from . import sync_client_cursor
 from . import webhook_log
+from . import webhook_subscriber
+from . import webhook_record_version
+from . import webhook_replay
+from . import webhook_stats
+from . import webhook_breaker_state
 from . import cus_models
+from . import webhook_capture
 
 
 
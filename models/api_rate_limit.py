@@ -0,0 +1,146 @@
+# models/api_rate_limit.py
+from odoo import models, fields, api
+from odoo.http import request
+import collections
+import functools
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from .auth_user_token import get_token_settings
+from .webhook_dispatcher import RateLimiter, get_rate_limiter
+
+_logger = logging.getLogger(__name__)
+
+# Length of the fixed windows counted in the shared table, in seconds
+SHARED_WINDOW = 60
+# Idle token limiters are pruned once there are more than this many
+TOKEN_LIMITERS_SIZE = 1000
+
+# Least recently used first
+_token_limiters = collections.OrderedDict()
+_token_limiters_lock = threading.Lock()
+
+
+def _token_limiter(key, rate, burst):
+    """In-memory token bucket of one API token"""
+    with _token_limiters_lock:
+        limiter = _token_limiters.get(key)
+        if limiter is None:
+            # A pruned bucket restarts full, so only buckets that have refilled
+            # by now are pruned, starting with the least recently used
+            while len(_token_limiters) >= TOKEN_LIMITERS_SIZE:
+                oldest_key, oldest = next(iter(_token_limiters.items()))
+                if not oldest.is_idle():
+                    break
+                del _token_limiters[oldest_key]
+            limiter = _token_limiters[key] = RateLimiter(rate, burst)
+        else:
+            _token_limiters.move_to_end(key)
+            if (limiter.rate, limiter.burst) != (rate, max(1, burst)):
+                limiter.configure(rate, burst, 0)
+        return limiter
+
+
+def _too_many_requests(retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    error = {'error': 'Too many requests', 'status': 429, 'retry_after': retry_after}
+    if request.dispatcher.routing_type == 'json':
+        return error
+    return request.make_json_response(error, status=429, headers=[('Retry-After', str(retry_after))])
+
+
+def rate_limited(endpoint):
+    """
+    Admission control of a heavy endpoint: every API token gets the rate of
+    the active configuration, and at most ``api_max_concurrent`` calls of
+    the endpoint run at once in this process. Calls over either limit are
+    answered right away with a 429 and ``Retry-After`` rather than queuing
+    on the database. Put it below ``@token_required``.
+    """
+    @functools.wraps(endpoint)
+    def wrapper(self, *args, **kwargs):
+        env = request.env
+        settings = get_token_settings(env)
+        token = request.httprequest.headers.get('Authorization') or ''
+        
+        if settings['rate_limit']:
+            if settings['rate_limit_shared']:
+                retry_after = env['api.rate.limit.counter'].sudo()._hit(
+                    hashlib.sha256(token.encode()).hexdigest(),
+                    settings['rate_limit'] * SHARED_WINDOW + settings['rate_burst'],
+                )
+            else:
+                limiter = _token_limiter((env.cr.dbname, token), settings['rate_limit'], settings['rate_burst'])
+                retry_after = limiter.try_acquire()
+                if not retry_after:
+                    # Only the rate applies to tokens, not the in-flight count
+                    limiter.release()
+            if retry_after:
+                return _too_many_requests(retry_after)
+        
+        if not settings['max_concurrent']:
+            return endpoint(self, *args, **kwargs)
+        limiter = get_rate_limiter(
+            f'api:{env.cr.dbname}:{endpoint.__qualname__}', max_in_flight=settings['max_concurrent']
+        )
+        if limiter.try_acquire():
+            return _too_many_requests(1)
+        try:
+            return endpoint(self, *args, **kwargs)
+        finally:
+            limiter.release()
+    return wrapper
+
+
+class ApiRateLimitCounter(models.Model):
+    """
+    Calls per API token and fixed window, shared by every worker when the
+    configuration enables it. Counting costs one statement per call on a
+    dedicated cursor, so the call's own transaction never holds the row.
+    """
+    _name = 'api.rate.limit.counter'
+    _description = 'API Rate Limit Counter'
+    _log_access = False
+
+    key = fields.Char(required=True, readonly=True, help='Hash of the API token')
+    period = fields.Integer(required=True, readonly=True, help='Window number since the epoch')
+    count = fields.Integer(readonly=True)
+
+    _sql_constraints = [
+        ('key_period_unique', 'unique(key, period)', 'One counter per token and window'),
+    ]
+
+    @api.model
+    def _hit(self, key, limit):
+        """
+        Count a call of ``key`` in the current window.
+
+        :return: 0 when the call is within ``limit``, otherwise the seconds
+                 until the next window
+        """
+        now = time.time()
+        period = int(now // SHARED_WINDOW)
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO api_rate_limit_counter (key, period, count)
+                VALUES (%s, %s, 1)
+                ON CONFLICT (key, period) DO UPDATE
+                SET count = api_rate_limit_counter.count + 1
+                RETURNING count
+            """, (key, period))
+            count = cr.fetchone()[0]
+        if count <= limit:
+            return 0
+        return (period + 1) * SHARED_WINDOW - now
+
+    @api.model
+    def _cron_prune_counters(self):
+        """Delete the counters of past windows"""
+        self.env.cr.execute(
+            "DELETE FROM api_rate_limit_counter WHERE period < %s",
+            (int(time.time() // SHARED_WINDOW),)
+        )
+        self.invalidate_model()
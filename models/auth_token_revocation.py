@@ -0,0 +1,63 @@
+# models/auth_token_revocation.py
+from odoo import models, fields, api
+import logging
+
+from .auth_user_token import signal_token_change
+
+_logger = logging.getLogger(__name__)
+
+
+class AuthTokenRevocation(models.Model):
+    """
+    Signed API tokens revoked before their expiry. Signed tokens are never
+    stored, so this short list is the only state checked when verifying
+    them; it is cached in memory by every worker until the token generation
+    moves.
+    """
+    _name = 'auth.token.revocation'
+    _description = 'API Token Revocation'
+    _order = 'id desc'
+    _rec_name = 'jti'
+
+    jti = fields.Char(string='Token ID', required=True, readonly=True)
+    user_id = fields.Many2one(
+        'auth.user.token',
+        string='API User',
+        required=True,
+        readonly=True,
+        ondelete='cascade'
+    )
+    expires_at = fields.Datetime(
+        string='Token Expiration',
+        required=True,
+        readonly=True,
+        help='The entry is pruned once the token has expired anyway'
+    )
+
+    _sql_constraints = [
+        ('jti_unique', 'unique(jti)', 'This token is already revoked'),
+    ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        signal_token_change(self.env)
+        return records
+
+    def unlink(self):
+        result = super().unlink()
+        signal_token_change(self.env)
+        return result
+
+    @api.model
+    def _get_revoked(self):
+        """Ids of the revoked tokens that have not expired yet"""
+        return self.search([('expires_at', '>', fields.Datetime.now())]).mapped('jti')
+
+    @api.model
+    def _cron_prune_revocations(self):
+        """Drop the revocations of tokens that have expired"""
+        expired = self.search([('expires_at', '<=', fields.Datetime.now())])
+        if expired:
+            expired.unlink()
+            _logger.info(f"Pruned {len(expired)} expired token revocations")
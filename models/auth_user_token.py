@@ -1,7 +1,234 @@
 from odoo import models, fields, http, api
 from odoo.http import request, route
+from odoo.tools import consteq
+from odoo.tools.misc import hmac as hmac_tool
+from datetime import datetime, timedelta
+import functools
 import hashlib
 import json
+import secrets
+import threading
+import time
+
+# Seconds a valid token is trusted without looking it up again
+TOKEN_CACHE_TTL = 60
+# Expired entries are pruned once the cache grows past this size
+TOKEN_CACHE_SIZE = 1000
+# Seconds between two checks of the token generation of a database
+TOKEN_GENERATION_CHECK_INTERVAL = 5
+# Counter bumped whenever tokens or token settings change
+TOKEN_GENERATION_PARAM = 'sync_app.token_generation'
+# Prefix of the signed tokens, which random hex tokens never start with
+SIGNED_TOKEN_PREFIX = 's1'
+SIGNED_TOKEN_SCOPE = 'sync_app.api_token'
+
+_token_cache = {}
+_token_settings_cache = {}
+_token_generations = {}
+_token_cache_lock = threading.Lock()
+
+
+def invalidate_token_cache(db_name=None, tokens=None):
+    """
+    Drop the given cached tokens of a database, or all its tokens and token
+    settings when no tokens are given, or the whole cache.
+    """
+    with _token_cache_lock:
+        if not db_name:
+            _token_cache.clear()
+            _token_settings_cache.clear()
+        elif tokens is not None:
+            for token in tokens:
+                _token_cache.pop((db_name, token), None)
+        else:
+            _token_settings_cache.pop(db_name, None)
+            for key in [key for key in _token_cache if key[0] == db_name]:
+                del _token_cache[key]
+
+
+def _bump_token_generation(env):
+    """
+    Tell every worker that tokens or token settings of the database changed.
+    
+    The counter is updated in the current transaction, so other workers only
+    see it once the change is committed. It is written directly rather than
+    through ``set_param``, which would clear every registry cache.
+    """
+    env.cr.execute("""
+        INSERT INTO ir_config_parameter (key, value, create_uid, create_date, write_uid, write_date)
+        VALUES (%s, '1', %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+        ON CONFLICT (key) DO UPDATE
+        SET value = (ir_config_parameter.value::integer + 1)::text, write_date = EXCLUDED.write_date
+    """, (TOKEN_GENERATION_PARAM, env.uid, env.uid))
+
+
+def signal_token_change(env, tokens=None):
+    """
+    Drop the given cached tokens of the database, or all of them and the
+    token settings, here, and bump the token generation so the other
+    workers drop theirs too.
+    """
+    invalidate_token_cache(env.cr.dbname, tokens)
+    _bump_token_generation(env)
+
+
+def _check_token_generation(env):
+    """
+    Drop the cached tokens and token settings of the database when its token
+    generation moved. The counter is read at most once every
+    TOKEN_GENERATION_CHECK_INTERVAL seconds, which bounds how long another
+    worker may keep accepting a rotated or revoked token.
+    """
+    db_name = env.cr.dbname
+    now = time.monotonic()
+    with _token_cache_lock:
+        cached = _token_generations.get(db_name)
+    if cached and cached[1] > now:
+        return
+    env.cr.execute("SELECT value FROM ir_config_parameter WHERE key = %s", (TOKEN_GENERATION_PARAM,))
+    row = env.cr.fetchone()
+    generation = row[0] if row else None
+    if not cached or cached[0] != generation:
+        invalidate_token_cache(db_name)
+    with _token_cache_lock:
+        _token_generations[db_name] = (generation, now + TOKEN_GENERATION_CHECK_INTERVAL)
+
+
+def get_token_settings(env):
+    """
+    Token mode of the active configuration, with what signed tokens are
+    checked against: the API users and the revoked token ids. Cached in
+    memory per database until its token generation moves.
+    """
+    db_name = env.cr.dbname
+    _check_token_generation(env)
+    with _token_cache_lock:
+        cached = _token_settings_cache.get(db_name)
+    if cached:
+        return cached
+    
+    config = env['sync.app.config'].sudo().search([('active', '=', True)], limit=1)
+    settings = {
+        'mode': config.api_token_mode or 'random',
+        'lifetime': config.api_token_lifetime or 24,
+        'refresh_lifetime': config.api_refresh_token_lifetime or 30,
+        'rate_limit': config.api_rate_limit,
+        'rate_burst': config.api_rate_burst or 1,
+        'rate_limit_shared': config.api_rate_limit_shared,
+        'max_concurrent': config.api_max_concurrent,
+        'valid_after': {
+            user['id']: user['signed_tokens_valid_after']
+            for user in env['auth.user.token'].sudo().search_read([], ['signed_tokens_valid_after'])
+        },
+        'revoked': frozenset(env['auth.token.revocation'].sudo()._get_revoked()),
+    }
+    with _token_cache_lock:
+        _token_settings_cache[db_name] = settings
+    return settings
+
+
+def _sign_token(env, message):
+    return hmac_tool(env, SIGNED_TOKEN_SCOPE, message)
+
+
+def _parse_signed_token(env, token):
+    """
+    Check the signature of a signed token.
+    
+    :return: (user_id, issued_at, expires_at, jti) as epoch seconds, or None
+    """
+    try:
+        prefix, user_id, issued_at, expires_at, jti, signature = token.split('.')
+        claims = (int(user_id), int(issued_at), int(expires_at), jti)
+    except ValueError:
+        return None
+    if prefix != SIGNED_TOKEN_PREFIX:
+        return None
+    if not consteq(signature, _sign_token(env, token.rsplit('.', 1)[0])):
+        return None
+    return claims
+
+
+def _authenticate_signed_token(env, token):
+    settings = get_token_settings(env)
+    if settings['mode'] != 'signed':
+        return None
+    claims = _parse_signed_token(env, token)
+    if not claims:
+        return None
+    user_id, issued_at, expires_at, jti = claims
+    if expires_at < time.time() or jti in settings['revoked'] or user_id not in settings['valid_after']:
+        return None
+    valid_after = settings['valid_after'][user_id]
+    if valid_after and datetime.utcfromtimestamp(issued_at) < valid_after:
+        return None
+    return env['auth.user.token'].sudo().browse(user_id)
+
+
+def authenticate_token(env, token):
+    """
+    Get the auth.user.token record owning ``token`` if it is valid.
+    
+    Signed tokens are verified in memory against the cached token settings,
+    without any query. Random tokens are cached in memory per process for
+    TOKEN_CACHE_TTL seconds. Rotating a token drops the local entry and
+    bumps the token generation, which the other workers check every
+    TOKEN_GENERATION_CHECK_INTERVAL seconds, so a rotated token stops
+    working everywhere within that delay while the lookup usually costs no
+    query.
+    
+    :return: auth.user.token record, or None
+    """
+    if not token:
+        return None
+    if token.startswith(SIGNED_TOKEN_PREFIX + '.'):
+        return _authenticate_signed_token(env, token)
+    
+    key = (env.cr.dbname, token)
+    _check_token_generation(env)
+    now = time.monotonic()
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached and cached[0] > now:
+        user_id, expiration = cached[1], cached[2]
+    else:
+        session = env['auth.user.token.session'].sudo().search([('token', '=', token)], limit=1)
+        # Tokens issued before sessions existed live on the user itself
+        user = session.user_id if session else env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
+        expiration = session.token_expiration if session else user.token_expiration
+        if not user or not expiration:
+            return None
+        user_id = user.id
+        with _token_cache_lock:
+            if len(_token_cache) >= TOKEN_CACHE_SIZE:
+                for stale in [k for k, v in _token_cache.items() if v[0] <= now]:
+                    del _token_cache[stale]
+            _token_cache[key] = (now + TOKEN_CACHE_TTL, user_id, expiration)
+    
+    if expiration < datetime.utcnow():
+        with _token_cache_lock:
+            _token_cache.pop(key, None)
+        return None
+    return env['auth.user.token'].sudo().browse(user_id)
+
+
+def token_required(endpoint):
+    """
+    Reject calls to ``endpoint`` without a valid token in the Authorization
+    header. Put it below ``@http.route``; the endpoint finds the token
+    record in ``request.api_user``.
+    """
+    @functools.wraps(endpoint)
+    def wrapper(self, *args, **kwargs):
+        user = authenticate_token(request.env, request.httprequest.headers.get('Authorization'))
+        if not user:
+            error = {'error': 'Unauthorized or token expired', 'status': 401}
+            if request.dispatcher.routing_type == 'json':
+                return error
+            return request.make_json_response(error, status=401)
+        request.api_user = user
+        return endpoint(self, *args, **kwargs)
+    return wrapper
 
 
 class AuthUserToken(models.Model):
@@ -10,8 +237,18 @@ class AuthUserToken(models.Model):
 
     name = fields.Char(required=True)
     password_hash = fields.Char(required=True)
-    token = fields.Char(readonly=True)
-    token_expiration = fields.Datetime(readonly=True)
+    token = fields.Char(readonly=True, index=True, copy=False)
+    token_expiration = fields.Datetime(readonly=True, copy=False)
+    signed_tokens_valid_after = fields.Datetime(
+        readonly=True,
+        copy=False,
+        help='Signed tokens issued before this date are rejected'
+    )
+    session_ids = fields.One2many('auth.user.token.session', 'user_id', string='Sessions')
+
+    _sql_constraints = [
+        ('token_unique', 'unique(token)', 'API tokens must be unique'),
+    ]
 
     def set_password(self, raw_password):
         self.password_hash = hashlib.sha256(raw_password.encode()).hexdigest()
@@ -24,13 +261,64 @@ class AuthUserToken(models.Model):
         if 'password_hash' in vals:
             raw_password = vals.pop('password_hash')
             vals['password_hash'] = hashlib.sha256(raw_password.encode()).hexdigest()
-        return super().create(vals)
+        record = super().create(vals)
+        # Signed tokens are only accepted for known users
+        signal_token_change(self.env)
+        return record
     
     def write(self, vals):
         if 'password_hash' in vals:
             raw_password = vals.pop('password_hash')
             vals['password_hash'] = hashlib.sha256(raw_password.encode()).hexdigest()
-        return super().write(vals)
+        # Tokens replaced or expired by this write must stop working everywhere
+        old_tokens = []
+        if {'token', 'token_expiration'}.intersection(vals):
+            old_tokens = [token for token in self.mapped('token') if token]
+        result = super().write(vals)
+        if 'signed_tokens_valid_after' in vals:
+            signal_token_change(self.env)
+        elif old_tokens:
+            signal_token_change(self.env, old_tokens)
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        signal_token_change(self.env)
+        return result
+
+    def _issue_signed_token(self, lifetime_hours):
+        """
+        Issue a token carrying the user id and expiry, signed with the
+        database secret. Nothing is stored: the token is verified in memory.
+        
+        :return: (token, expiration datetime)
+        """
+        self.ensure_one()
+        now = int(time.time())
+        expires_at = now + lifetime_hours * 3600
+        message = f"{SIGNED_TOKEN_PREFIX}.{self.id}.{now}.{expires_at}.{secrets.token_hex(8)}"
+        return f"{message}.{_sign_token(self.env, message)}", datetime.utcfromtimestamp(expires_at)
+
+    def _revoke_token(self, token):
+        """Make ``token`` of this user unusable before it expires"""
+        self.ensure_one()
+        if not token.startswith(SIGNED_TOKEN_PREFIX + '.'):
+            self.session_ids.filtered(lambda session: session.token == token).unlink()
+            if token == self.token:
+                self.write({'token': False, 'token_expiration': False})
+            return
+        claims = _parse_signed_token(self.env, token)
+        if claims and claims[0] == self.id:
+            self.env['auth.token.revocation'].sudo().create({
+                'jti': claims[3],
+                'user_id': self.id,
+                'expires_at': datetime.utcfromtimestamp(claims[2]),
+            })
+
+    def action_revoke_signed_tokens(self):
+        """Reject every signed token issued so far to these users"""
+        self.write({'signed_tokens_valid_after': fields.Datetime.now()})
+        return True
 
 
 
@@ -0,0 +1,147 @@
+# models/auth_user_token_session.py
+from odoo import models, fields, api
+from datetime import datetime, timedelta
+import hashlib
+import logging
+import secrets
+
+from .auth_user_token import signal_token_change
+
+_logger = logging.getLogger(__name__)
+
+
+def hash_refresh_token(refresh_token):
+    """Refresh tokens are long-lived, so only their hash is stored"""
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+class AuthUserTokenSession(models.Model):
+    """
+    One login of an API user, e.g. one POS device. Every device keeps its
+    own access token, and renews it with its refresh token instead of
+    logging in again.
+    """
+    _name = 'auth.user.token.session'
+    _description = 'API User Session'
+    _order = 'id desc'
+    _rec_name = 'device'
+
+    user_id = fields.Many2one(
+        'auth.user.token',
+        string='API User',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+    device = fields.Char(string='Device', help='Name sent by the client when logging in')
+    # Random access token; empty when signed tokens are issued
+    token = fields.Char(readonly=True, index=True, copy=False)
+    token_expiration = fields.Datetime(readonly=True, copy=False)
+    refresh_token_hash = fields.Char(required=True, readonly=True, index=True, copy=False)
+    refresh_expiration = fields.Datetime(string='Refresh Expiration', required=True, readonly=True, index=True)
+    last_refresh_at = fields.Datetime(string='Last Refresh', readonly=True)
+
+    _sql_constraints = [
+        ('token_unique', 'unique(token)', 'API tokens must be unique'),
+        ('refresh_token_hash_unique', 'unique(refresh_token_hash)', 'Refresh tokens must be unique'),
+    ]
+
+    # ============================================
+    # CRUD
+    # ============================================
+    def write(self, vals):
+        # Tokens replaced or expired by this write must stop working everywhere;
+        # sessions without a token yet (just opened) have nothing to signal
+        old_tokens = []
+        if {'token', 'token_expiration'}.intersection(vals):
+            old_tokens = [token for token in self.mapped('token') if token]
+        result = super().write(vals)
+        if old_tokens:
+            signal_token_change(self.env, old_tokens)
+        return result
+
+    def unlink(self):
+        old_tokens = [token for token in self.mapped('token') if token]
+        result = super().unlink()
+        if old_tokens:
+            signal_token_change(self.env, old_tokens)
+        return result
+
+    # ============================================
+    # TOKENS
+    # ============================================
+    @api.model
+    def _open(self, user, settings, device=None):
+        """
+        Start a session for ``user``.
+
+        :return: response of /api/auth/token
+        """
+        refresh_token = secrets.token_hex(32)
+        session = self.create({
+            'user_id': user.id,
+            'device': device,
+            'refresh_token_hash': hash_refresh_token(refresh_token),
+            'refresh_expiration': datetime.utcnow() + timedelta(days=settings['refresh_lifetime']),
+        })
+        return session._issue(settings, refresh_token)
+
+    @api.model
+    def _find_by_refresh_token(self, refresh_token):
+        """Session of a refresh token that has not expired, if any"""
+        if not refresh_token:
+            return self.browse()
+        return self.search([
+            ('refresh_token_hash', '=', hash_refresh_token(refresh_token)),
+            ('refresh_expiration', '>', fields.Datetime.now()),
+        ], limit=1)
+
+    def _refresh(self, settings):
+        """
+        Issue a new access token and rotate the refresh token, so a stolen
+        refresh token stops working once the device has used it.
+
+        :return: response of /api/auth/refresh
+        """
+        self.ensure_one()
+        refresh_token = secrets.token_hex(32)
+        self.write({
+            'refresh_token_hash': hash_refresh_token(refresh_token),
+            'refresh_expiration': datetime.utcnow() + timedelta(days=settings['refresh_lifetime']),
+            'last_refresh_at': fields.Datetime.now(),
+        })
+        return self._issue(settings, refresh_token)
+
+    def _issue(self, settings, refresh_token):
+        self.ensure_one()
+        if settings['mode'] == 'signed':
+            token, expiration = self.user_id._issue_signed_token(settings['lifetime'])
+            if self.token:
+                self.write({'token': False, 'token_expiration': False})
+        else:
+            token = secrets.token_hex(32)
+            expiration = datetime.utcnow() + timedelta(hours=settings['lifetime'])
+            self.write({'token': token, 'token_expiration': expiration})
+        return {
+            'token': token,
+            'expires_at': expiration.isoformat(),
+            'refresh_token': refresh_token,
+            'refresh_expires_at': self.refresh_expiration.isoformat(),
+        }
+
+    # ============================================
+    # SCHEDULER
+    # ============================================
+    @api.model
+    def _cron_prune_sessions(self):
+        """Delete the sessions whose refresh token has expired, in one statement"""
+        self.env.cr.execute("""
+            DELETE FROM auth_user_token_session
+            WHERE refresh_expiration < (now() at time zone 'UTC')
+            AND (token_expiration IS NULL OR token_expiration < (now() at time zone 'UTC'))
+        """)
+        pruned = self.env.cr.rowcount
+        self.invalidate_model()
+        if pruned:
+            _logger.info(f"Pruned {pruned} expired API sessions")
+        return pruned
@@ -1,6 +1,8 @@
 from odoo import models,http, fields, api,_
 from odoo.exceptions import  UserError
+import atexit
 import time
+import gzip
 import requests
 from odoo.http import request
 import threading
@@ -11,6 +13,16 @@ import uuid
 import datetime
 import secrets
 from datetime import date, datetime, timedelta
+from email.utils import parsedate_to_datetime
+from .api_rate_limit import rate_limited
+from .auth_user_token import get_token_settings, token_required
+from .sync_client_cursor import decode_sync_cursor, encode_sync_cursor
+from .webhook_log import encode_log_payload, is_full_update
+from .webhook_dispatcher import (
+    PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL,
+    current_dispatchers, current_log_writer, get_circuit_breaker, get_dispatcher, get_http_session, get_log_writer,
+    get_rate_limiter,
+)
 
 _logger = logging.getLogger(__name__)
 
@@ -26,8 +38,35 @@ def sanitize(obj):
     return obj
 
 
+_webhook_config_cache = {}
+_webhook_config_lock = threading.Lock()
+
+
+def invalidate_webhook_config_cache(db_name=None):
+    """Drop the cached webhook configuration of one database, or of all"""
+    with _webhook_config_lock:
+        if db_name:
+            _webhook_config_cache.pop(db_name, None)
+        else:
+            _webhook_config_cache.clear()
+
+
+def _cache_webhook_config(db_name, sequence, config):
+    """Remember the configuration read at registry cache ``sequence``"""
+    with _webhook_config_lock:
+        _webhook_config_cache[db_name] = (sequence, config)
+    return dict(config) if config else None
+
+
 def _get_webhook_config():
-    """Get webhook configuration from database."""
+    """
+    Get webhook configuration, cached in memory per database.
+    
+    A cache entry is tied to the registry cache sequence. Writes on
+    sync.app.config clear the local entry and signal the other workers
+    through the registry, whose sequence then no longer matches, so the hot
+    send path normally needs no cursor at all.
+    """
     try:
         from odoo import api, SUPERUSER_ID
         from odoo.modules.registry import Registry
@@ -38,28 +77,173 @@ def _get_webhook_config():
             return None
         
         registry = Registry(db_name)
+        sequence = getattr(registry, 'cache_sequence', None)
+        with _webhook_config_lock:
+            cached = _webhook_config_cache.get(db_name)
+        if cached and cached[0] == sequence:
+            return dict(cached[1]) if cached[1] else None
+        
         with registry.cursor() as cr:
             env = api.Environment(cr, SUPERUSER_ID, {})
             config = env['sync.app.config'].search([('active', '=', True)], limit=1)
             
-            if not config or not config.webhook_enabled or not config.webhook_url:
-                return None
+            if not config or not config.webhook_enabled:
+                return _cache_webhook_config(db_name, sequence, None)
             
-            return {
+            subscribers = []
+            if config.webhook_url:
+                # The URL of the configuration is the default subscriber, receiving everything
+                subscribers.append({
+                    'subscriber_id': False,
+                    'url': config.webhook_url,
+                    'auth_token': config.webhook_auth_token,
+                    'models': None,
+                    'operations': None,
+                })
+            for subscriber in config.webhook_subscriber_ids.filtered('active'):
+                subscribers.append(subscriber._get_target_values())
+            if not subscribers:
+                return _cache_webhook_config(db_name, sequence, None)
+            
+            return _cache_webhook_config(db_name, sequence, {
                 'url': config.webhook_url,
                 'timeout': config.webhook_timeout or 10,
                 'retry_delay': config.webhook_retry_delay or 60,
                 'max_retries': config.webhook_max_retries or 0,
                 'verify_ssl': config.webhook_verify_ssl,
                 'auth_token': config.webhook_auth_token,
-            }
+                'worker_count': config.webhook_worker_count or 4,
+                'queue_size': config.webhook_queue_size or 1000,
+                'delivery_mode': config.webhook_delivery_mode or 'dispatcher',
+                'outbox_batch_size': config.webhook_outbox_batch_size or 100,
+                'pool_connections': config.webhook_pool_connections or 4,
+                'pool_maxsize': config.webhook_pool_maxsize or 10,
+                'batch_enabled': config.webhook_batch_enabled,
+                'batch_size': config.webhook_batch_size or 50,
+                'batch_max_bytes': config.webhook_batch_max_bytes or 262144,
+                'batch_window_ms': config.webhook_batch_window_ms or 500,
+                'log_flush_interval': config.webhook_log_flush_interval,
+                'retry_max_delay': config.webhook_retry_max_delay or 3600,
+                'log_compress_min_bytes': config.webhook_log_compress_min_bytes,
+                'gzip_min_bytes': config.webhook_gzip_min_bytes,
+                'breaker_threshold': config.webhook_breaker_threshold,
+                'breaker_cooldown': config.webhook_breaker_cooldown or 60,
+                'rate_limit': config.webhook_rate_limit,
+                'rate_burst': config.webhook_rate_burst or 1,
+                'max_in_flight': config.webhook_max_in_flight,
+                'delta_enabled': config.webhook_delta_enabled,
+                'drain_timeout': config.webhook_drain_timeout,
+                'lease_timeout': config.webhook_lease_timeout or 600,
+                'subscribers': subscribers,
+            })
     except Exception as e:
         _logger.error(f"Failed to get webhook config: {e}")
         return None
 
 
-def _create_webhook_log(payload, config):
-    """Create a webhook log entry"""
+# Modes in which requests only store the log and another process sends it
+DEFERRED_DELIVERY_MODES = ('outbox', 'standalone')
+
+
+# Map integer operation from webhook to string for database
+WEBHOOK_OPERATIONS = {
+    0: 'create', 
+    1: 'update', 
+    2: 'delete',
+    3: 'create',  # validate operations treated as create
+    6: 'create',  # purchase order operations
+    7: 'create'   # stock picking operations
+}
+
+
+def _webhook_targets(config, model, operation):
+    """
+    Configurations of the subscribers that want events of ``model`` with
+    ``operation``. Checked before a payload is built or serialized, so an
+    event nobody subscribed to costs nothing.
+    """
+    kind = WEBHOOK_OPERATIONS.get(operation, 'create')
+    return [
+        dict(config, **subscriber)
+        for subscriber in config['subscribers']
+        if (subscriber['models'] is None or model in subscriber['models'])
+        and (subscriber['operations'] is None or kind in subscriber['operations'])
+    ]
+
+
+def _webhook_target(config, subscriber_id=False):
+    """Configuration of one subscriber (False = the default URL), None if gone"""
+    for subscriber in config['subscribers']:
+        if subscriber['subscriber_id'] == (subscriber_id or False):
+            return dict(config, **subscriber)
+    return None
+
+
+def _webhook_record_key(payload, config=None):
+    """Ordering key of an event: its subscriber, model and record ids"""
+    ids = ','.join(str(record_id) for record_id in sorted(payload.get('ids') or [], key=str))
+    key = f"{payload.get('model', '')}:{ids}"
+    subscriber_id = config and config.get('subscriber_id')
+    return f"{subscriber_id}/{key}" if subscriber_id else key
+
+
+# Purchase order and stock picking operations
+TRANSACTIONAL_OPERATIONS = (6, 7)
+# Product, variant, loyalty program, rule and reward events, and checkpoints
+CATALOG_TYPES = (0, 1, 2, 3, 4, 99)
+
+
+def _webhook_priority(payload):
+    """
+    Delivery lane of an event: order and stock events go ahead of the bulk
+    catalog churn, everything else sits in between.
+    """
+    if payload.get('operation') in TRANSACTIONAL_OPERATIONS:
+        return PRIORITY_HIGH
+    if payload.get('type') in CATALOG_TYPES:
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
+def _prepare_webhook_log_vals(payload, config, status='pending'):
+    """Build the webhook.log values for a payload"""
+    headers = _webhook_headers(config)
+    # The token is added again from the configuration when sending
+    if 'Authorization' in headers:
+        headers['Authorization'] = 'Bearer ***'
+    
+    operation_value = WEBHOOK_OPERATIONS.get(payload.get('operation', 0), 'create')
+    
+    _logger.info(f"Creating webhook log - Model: {payload.get('model')}, Operation: {operation_value}")
+    
+    stored_payload, payload_encoding = encode_log_payload(payload, config.get('log_compress_min_bytes', 0))
+    
+    return {
+        'url': config['url'],
+        'subscriber_id': config.get('subscriber_id') or False,
+        'model': payload.get('model', ''),
+        'operation': operation_value,
+        'record_ids': str(payload.get('ids', [])),
+        'record_key': _webhook_record_key(payload, config),
+        'priority': str(_webhook_priority(payload)),
+        'payload': stored_payload,
+        'payload_encoding': payload_encoding,
+        'headers': json.dumps(headers, separators=(',', ':')),
+        'status': status,
+        'max_retries': config['max_retries'],
+    }
+
+
+def _create_webhook_logs(payload, targets, status='pending'):
+    """
+    Create one webhook log entry per subscriber in ``targets``.
+    With delta payloads enabled, ``payload`` is turned into its delta in
+    place; nothing is created when there is nothing to send.
+    
+    :return: list of log ids, in the order of ``targets``. A ``queued`` log
+             that must wait for an older log of its record is left
+             ``pending`` for the scheduler and returned as False.
+    """
     try:
         from odoo import api, SUPERUSER_ID
         from odoo.modules.registry import Registry
@@ -68,51 +252,31 @@ def _create_webhook_log(payload, config):
         db_name = odoo.tools.config.get('db_name')
         if not db_name:
             _logger.error("No database name found")
-            return None
+            return []
         
         registry = Registry(db_name)
         with registry.cursor() as cr:
             env = api.Environment(cr, SUPERUSER_ID, {})
             
-            headers = {'Content-Type': 'application/json'}
-            if config.get('auth_token'):
-                headers['Authorization'] = f'Bearer {config["auth_token"]}'
+            if targets[0].get('delta_enabled') and not env['webhook.record.version']._apply_delta(payload):
+                return []
             
-            # Map integer operation from webhook to string for database
-            operation_map = {
-                0: 'create', 
-                1: 'update', 
-                2: 'delete',
-                3: 'create',  # validate operations treated as create
-                6: 'create',  # purchase order operations
-                7: 'create'   # stock picking operations
-            }
-            operation_value = operation_map.get(payload.get('operation', 0), 'create')
-            
-            _logger.info(f"Creating webhook log - Model: {payload.get('model')}, Operation: {operation_value}")
+            logs = env['webhook.log'].create([
+                _prepare_webhook_log_vals(payload, target, status) for target in targets
+            ])
+            parked = logs._park_behind_older() if status == 'queued' else logs.browse()
             
-            log = env['webhook.log'].create({
-                'url': config['url'],
-                'model': payload.get('model', ''),
-                'operation': operation_value,
-                'record_ids': str(payload.get('ids', [])),
-                'payload': json.dumps(payload, indent=2),
-                'headers': json.dumps(headers, indent=2),
-                'status': 'pending',
-                'max_retries': config['max_retries'],
-            })
-            
-            log_id = log.id
+            log_ids = [log.id if log not in parked else False for log in logs]
             cr.commit()
             
-            _logger.info(f"✅ Webhook log created with ID: {log_id}")
-            return log_id
+            _logger.info(f"✅ Webhook logs created with IDs: {log_ids}")
+            return log_ids
             
     except Exception as e:
         _logger.error(f"Failed to create webhook log: {e}")
         import traceback
         _logger.error(traceback.format_exc())
-        return None
+        return []
 
 
 def _update_webhook_log(log_id, values):
@@ -152,109 +316,677 @@ def _update_webhook_log(log_id, values):
         _logger.error(traceback.format_exc())
 
 
-def _webhook_worker(payload, config, log_id=None):
-    """Worker function that sends webhook"""
+def _update_webhook_logs(values_by_id, raise_errors=False):
+    """
+    Write the values of several webhook logs on a single cursor.
+    Errors are logged, or raised with ``raise_errors`` for callers that
+    keep the values to try again.
+    """
+    if not values_by_id:
+        return
+    
+    try:
+        from odoo import api, SUPERUSER_ID
+        from odoo.modules.registry import Registry
+        import odoo
+        
+        db_name = odoo.tools.config.get('db_name')
+        if not db_name:
+            _logger.error("No database name found")
+            return
+        
+        registry = Registry(db_name)
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            logs = env['webhook.log'].browse([log_id for log_id in values_by_id if log_id]).exists()
+            for log in logs:
+                log.write(values_by_id[log.id])
+            cr.commit()
+            
+            _logger.info(f"✅ {len(logs)} webhook logs updated successfully")
+            
+    except Exception as e:
+        if raise_errors:
+            raise
+        _logger.error(f"Failed to update webhook logs {list(values_by_id)}: {e}")
+        import traceback
+        _logger.error(traceback.format_exc())
+
+
+def _webhook_headers(config):
+    """Build the HTTP headers sent to the webhook receiver"""
+    headers = {'Content-Type': 'application/json'}
+    if config['auth_token']:
+        headers['Authorization'] = f'Bearer {config["auth_token"]}'
+    return headers
+
+
+def _post_webhook(body, config):
+    """
+    POST a JSON body to the configured URL through the pooled session.
+    
+    The body is serialized without whitespace and gzip-compressed with a
+    ``Content-Encoding`` header once it reaches ``gzip_min_bytes``.
+    Returns the response and the duration in milliseconds.
+    """
+    session = get_http_session(
+        config['url'],
+        pool_connections=config.get('pool_connections', 4),
+        pool_maxsize=config.get('pool_maxsize', 10),
+    )
+    headers = _webhook_headers(config)
+    data = json.dumps(body, separators=(',', ':'), default=str).encode()
+    if config.get('gzip_min_bytes') and len(data) >= config['gzip_min_bytes']:
+        data = gzip.compress(data)
+        headers['Content-Encoding'] = 'gzip'
+    
+    start_time = time.time()
+    response = session.post(
+        config['url'],
+        data=data,
+        headers=headers,
+        timeout=config['timeout'],
+        verify=config['verify_ssl']
+    )
+    duration_ms = int((time.time() - start_time) * 1000)
+    return response, duration_ms
+
+
+def _webhook_retry_delay(config, retry_count):
+    """
+    Exponential backoff with jitter: the base delay doubles with every
+    failed attempt up to ``retry_max_delay``, and a random share of up to
+    half of it is taken off so pending events do not retry in lockstep.
+    """
+    delay = min(config['retry_delay'] * (2 ** max(retry_count - 1, 0)), config['retry_max_delay'])
+    return delay - random.uniform(0, delay / 2)
+
+
+def _webhook_breaker(config):
+    """Circuit breaker of the configured webhook URL"""
     url = config['url']
-    timeout = config['timeout']
-    retry_delay = config['retry_delay']
+    return get_circuit_breaker(
+        url,
+        threshold=config.get('breaker_threshold', 0),
+        cooldown=config.get('breaker_cooldown', 60),
+        on_change=lambda state, failures: _store_breaker_state(url, state, failures),
+    )
+
+
+def _store_breaker_state(url, state, failures):
+    """Record the breaker state of ``url`` for the configuration form, on its own cursor"""
+    try:
+        from odoo import api, SUPERUSER_ID
+        from odoo.modules.registry import Registry
+        import odoo
+        
+        registry = Registry(odoo.tools.config.get('db_name'))
+        with registry.cursor() as cr:
+            api.Environment(cr, SUPERUSER_ID, {})['webhook.breaker.state']._store(url, state, failures)
+    except Exception as e:
+        _logger.error(f"Failed to store the circuit breaker state of {url}: {e}")
+
+
+# Longest a delivery waits for the rate limiter before it is postponed
+RATE_LIMIT_MAX_WAIT = 30
+
+
+def _webhook_rate_limiter(config):
+    """Rate limiter of the configured webhook URL"""
+    return get_rate_limiter(
+        config['url'],
+        rate=config.get('rate_limit', 0),
+        burst=config.get('rate_burst', 1),
+        max_in_flight=config.get('max_in_flight', 0),
+    )
+
+
+def _retry_after_seconds(error):
+    """
+    Seconds requested by the ``Retry-After`` header of a 429 or 503
+    response, as a number of seconds or an HTTP date; 0 when absent.
+    """
+    response = getattr(error, 'response', None)
+    if response is None or response.status_code not in (429, 503):
+        return 0
+    value = (response.headers.get('Retry-After') or '').strip()
+    if not value:
+        return 0
+    if value.isdigit():
+        return int(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0
+    return max(0, int(retry_at.timestamp() - time.time()))
+
+
+def _throttled_webhook_values(limiter):
+    """Log values for an event held back by the rate limiter"""
+    return {
+        'status': 'pending',
+        'error_message': 'Rate limit reached, delivery postponed',
+        'next_retry_at': datetime.fromtimestamp(max(limiter.paused_until, time.time() + RATE_LIMIT_MAX_WAIT)),
+    }
+
+
+def _record_webhook_error(error, breaker, limiter):
+    """
+    Feed a request error to the circuit breaker and rate limiter.
+    
+    :return: seconds the receiver asked us to wait (``Retry-After``)
+    """
+    retry_after = _retry_after_seconds(error)
+    if retry_after:
+        # Throttling, not an outage: slow down instead of opening the circuit,
+        # but a throttled probe keeps it open for at least that long
+        limiter.pause_until(time.time() + retry_after)
+        breaker.record_throttled(time.time() + retry_after)
+    elif _is_receiver_failure(error):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return retry_after
+
+
+def _is_receiver_failure(error):
+    """
+    Whether a request error means the receiver is unavailable.
+    Client errors other than 429 come from a healthy receiver.
+    """
+    response = getattr(error, 'response', None)
+    if response is None:
+        return True
+    return response.status_code >= 500 or response.status_code == 429
+
+
+def _parked_webhook_values(breaker):
+    """Log values for an event held back while the circuit is open"""
+    return {
+        'status': 'pending',
+        'error_message': 'Circuit breaker open, delivery postponed',
+        'next_retry_at': datetime.fromtimestamp(breaker.retry_at()),
+    }
+
+
+def _webhook_failure_values(config, retry_count, error, sent_at, duration_ms=0, retry_after=0):
+    """
+    Log values for a failed attempt: ``retrying`` with ``next_retry_at``,
+    or ``error`` once ``max_retries`` is reached (0 = unlimited).
+    The retry never happens before the receiver's ``Retry-After``.
+    """
+    retry_count += 1
     max_retries = config['max_retries']
-    verify_ssl = config['verify_ssl']
-    auth_token = config['auth_token']
     
-    # Prepare headers
-    headers = {'Content-Type': 'application/json'}
-    if auth_token:
-        headers['Authorization'] = f'Bearer {auth_token}'
+    if max_retries > 0 and retry_count >= max_retries:
+        _logger.error(f"Max retries ({max_retries}) reached, giving up")
+        return {
+            'status': 'error',
+            'error_message': error,
+            'retry_count': retry_count,
+            'sent_at': sent_at,
+            'completed_at': datetime.now(),
+            'duration_ms': duration_ms
+        }
+    
+    delay = max(_webhook_retry_delay(config, retry_count), retry_after)
+    _logger.info(f"Retry scheduled in {int(delay)} seconds")
+    return {
+        'status': 'retrying',
+        'error_message': error,
+        'retry_count': retry_count,
+        'sent_at': sent_at,
+        'next_retry_at': datetime.now() + timedelta(seconds=delay)
+    }
+
+
+def _attempt_webhook(payload, config, retry_count=0):
+    """
+    Make a single delivery attempt and return the resulting webhook.log values.
     
-    retry_count = 0
+    Nothing is written here, so the caller decides which transaction the
+    outcome lands in. The attempt waits for the destination's rate limiter
+    and is postponed when no slot frees up in time.
+    """
+    limiter = _webhook_rate_limiter(config)
+    if not limiter.acquire(timeout=RATE_LIMIT_MAX_WAIT):
+        return _throttled_webhook_values(limiter)
+    try:
+        return _send_webhook_attempt(payload, config, retry_count, limiter)
+    finally:
+        limiter.release()
+
+
+def _send_webhook_attempt(payload, config, retry_count, limiter):
+    """Delivery attempt of ``_attempt_webhook`` once the rate limiter let it through"""
     duration_ms = 0
+    sent_at = datetime.now()
+    breaker = _webhook_breaker(config)
+    if not breaker.allow():
+        return _parked_webhook_values(breaker)
     
-    while True:
-        try:
-            _logger.info(f"Sending webhook to {url} (attempt {retry_count + 1})")
-            
-            # Update status to sending
-            if log_id:
-                _update_webhook_log(log_id, {
-                    'status': 'sending',
-                    'retry_count': retry_count,
-                    'sent_at': datetime.now()
-                })
-            
-            start_time = time.time()
-            response = requests.post(
-                url,
-                json=payload,
-                headers=headers,
-                timeout=timeout,
-                verify=verify_ssl
-            )
-            duration_ms = int((time.time() - start_time) * 1000)
-            
-            response.raise_for_status()
-            
-            if response.ok:
-                _logger.info("✅ Webhook succeeded!")
-                response_body = None
-                try:
-                    response_body = json.dumps(response.json(), indent=2)
-                    _logger.info(f"Response: {response.json()}")
-                except ValueError:
-                    response_body = response.text
-                    _logger.info(f"Response: {response.text}")
-                
-                # Update log as success
-                if log_id:
-                    _update_webhook_log(log_id, {
-                        'status': 'success',
-                        'status_code': response.status_code,
-                        'response_body': response_body,
-                        'completed_at': datetime.now(),
-                        'duration_ms': duration_ms
-                    })
-                break
+    try:
+        _logger.info(f"Sending webhook to {config['url']} (attempt {retry_count + 1})")
+        
+        response, duration_ms = _post_webhook(payload, config)
+        response.raise_for_status()
+        breaker.record_success()
+        
+        _logger.info("✅ Webhook succeeded!")
+        response_body = response.text
+        _logger.info(f"Response: {response_body}")
+        
+        return {
+            'status': 'success',
+            'status_code': response.status_code,
+            'response_body': response_body,
+            'retry_count': retry_count,
+            'sent_at': sent_at,
+            'completed_at': datetime.now(),
+            'duration_ms': duration_ms
+        }
+
+    except requests.exceptions.RequestException as e:
+        _logger.error(f"Webhook error: {e}")
+        retry_after = _record_webhook_error(e, breaker, limiter)
+        return _webhook_failure_values(config, retry_count, str(e), sent_at, duration_ms, retry_after)
+
+    finally:
+        breaker.end_probe()
+
+
+def _chunk_webhook_batch(entries, batch_size, max_bytes):
+    """
+    Split (log_id, payload, retry_count) entries into chunks of at most
+    ``batch_size`` events and roughly ``max_bytes`` of JSON each.
+    A single event larger than ``max_bytes`` is sent on its own.
+    """
+    chunk, chunk_bytes = [], 0
+    for entry in entries:
+        size = len(json.dumps(entry[1], default=str))
+        if chunk and (len(chunk) >= batch_size or chunk_bytes + size > max_bytes):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(entry)
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def _batch_event_results(response):
+    """
+    Read per-event results from a batch response.
+    
+    The receiver may answer with a list, or ``{"results": [...]}``, of
+    objects carrying the ``event_id`` of each event and a ``status``
+    (``error``/``failed`` marks that event as failed). Events it does not
+    mention share the outcome of the HTTP call.
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    if isinstance(body, dict):
+        body = body.get('results')
+    if not isinstance(body, list):
+        return {}
+    return {
+        item['event_id']: item
+        for item in body
+        if isinstance(item, dict) and item.get('event_id') is not None
+    }
+
+
+def _attempt_webhook_batch(entries, config):
+    """
+    Send several events as one JSON array and return log values per log id.
+    
+    :param entries: list of (log_id, payload, retry_count)
+    :param config: webhook configuration dict
+    :return: dict {log_id: webhook.log values}
+    """
+    limiter = _webhook_rate_limiter(config)
+    if not limiter.acquire(timeout=RATE_LIMIT_MAX_WAIT):
+        return {log_id: _throttled_webhook_values(limiter) for log_id, _payload, _retry_count in entries}
+    try:
+        return _send_webhook_batch_attempt(entries, config, limiter)
+    finally:
+        limiter.release()
+
+
+def _send_webhook_batch_attempt(entries, config, limiter):
+    """Delivery attempt of ``_attempt_webhook_batch`` once the rate limiter let it through"""
+    sent_at = datetime.now()
+    breaker = _webhook_breaker(config)
+    if not breaker.allow():
+        return {log_id: _parked_webhook_values(breaker) for log_id, _payload, _retry_count in entries}
+    
+    body = [dict(payload, event_id=log_id) for log_id, payload, _retry_count in entries]
+    
+    try:
+        _logger.info(f"Sending webhook batch of {len(entries)} events to {config['url']}")
+        
+        response, duration_ms = _post_webhook(body, config)
+        response.raise_for_status()
+        breaker.record_success()
+        
+    except requests.exceptions.RequestException as e:
+        _logger.error(f"Webhook batch error: {e}")
+        retry_after = _record_webhook_error(e, breaker, limiter)
+        return {
+            log_id: _webhook_failure_values(config, retry_count, str(e), sent_at, retry_after=retry_after)
+            for log_id, _payload, retry_count in entries
+        }
+
+    finally:
+        breaker.end_probe()
+    
+    _logger.info(f"✅ Webhook batch of {len(entries)} events succeeded!")
+    results = _batch_event_results(response)
+    values_by_id = {}
+    for log_id, _payload, retry_count in entries:
+        result = results.get(log_id, {})
+        if result.get('status') in ('error', 'failed'):
+            error = result.get('error') or result.get('message') or 'Rejected by receiver'
+            values_by_id[log_id] = _webhook_failure_values(config, retry_count, error, sent_at, duration_ms)
+            continue
+        values_by_id[log_id] = {
+            'status': 'success',
+            'status_code': response.status_code,
+            'response_body': json.dumps(result, separators=(',', ':')) if result else response.text,
+            'retry_count': retry_count,
+            'sent_at': sent_at,
+            'completed_at': datetime.now(),
+            'duration_ms': duration_ms
+        }
+    return values_by_id
+
+
+def _record_webhook_logs(values_by_id, config):
+    """
+    Store delivery outcomes through the buffered log writer, or write them
+    right away when no flush interval is configured.
+    """
+    values_by_id = {log_id: values for log_id, values in values_by_id.items() if log_id}
+    if not config.get('log_flush_interval'):
+        _update_webhook_logs(values_by_id)
+        return
+    writer = get_log_writer(
+        lambda pending: _update_webhook_logs(pending, raise_errors=True), config['log_flush_interval']
+    )
+    for log_id, values in values_by_id.items():
+        writer.record(log_id, values)
+
+
+_queued_updates = {}
+_queued_updates_lock = threading.Lock()
+
+
+def _track_queued_update(payload, log_id, config=None):
+    """
+    Remember the newest update of a record queued in this process.
+    Deltas only carry their own changes, so they never replace older jobs.
+    """
+    if not is_full_update(payload) or not log_id:
+        return
+    with _queued_updates_lock:
+        _queued_updates[_webhook_record_key(payload, config)] = log_id
+
+
+def _untrack_queued_update(payload, log_id, config=None):
+    """Forget the update of a job that was not queued after all"""
+    key = _webhook_record_key(payload, config)
+    with _queued_updates_lock:
+        if log_id and _queued_updates.get(key) == log_id:
+            del _queued_updates[key]
+
+
+def _is_superseded(payload, log_id, config=None):
+    """
+    Whether a newer update of the same record was queued in this process
+    after this one, in which case this job must not be sent.
+    """
+    if payload.get('operation') != 1 or not log_id:
+        return False
+    key = _webhook_record_key(payload, config)
+    with _queued_updates_lock:
+        latest = _queued_updates.get(key)
+        if latest == log_id:
+            del _queued_updates[key]
+            return False
+        return latest is not None and latest > log_id
+
+
+def _superseded_values():
+    return {'status': 'superseded', 'completed_at': datetime.now(), 'next_retry_at': False}
+
+
+# Record key -> oldest log of that record that did not go through in this process
+_blocked_keys = {}
+_blocked_keys_lock = threading.Lock()
+
+
+def _track_unfinished(key, log_id, status):
+    """
+    Remember a record whose log was postponed or failed here, so its later
+    jobs already queued in memory wait for it; forget it once it went through.
+    """
+    if not log_id:
+        return
+    with _blocked_keys_lock:
+        blocker = _blocked_keys.get(key)
+        if status in ('pending', 'retrying'):
+            if blocker is None or log_id < blocker:
+                _blocked_keys[key] = log_id
+        elif blocker == log_id:
+            del _blocked_keys[key]
+
+
+def _is_blocked(payload, log_id, config=None):
+    """
+    Whether an older log of the same record is still unfinished, in which
+    case this job must not be sent before it. Only records that had a log
+    postponed or failed in this process are looked up in the database.
+    """
+    if not log_id:
+        return False
+    key = _webhook_record_key(payload, config)
+    with _blocked_keys_lock:
+        blocker = _blocked_keys.get(key)
+    if blocker is None or blocker >= log_id:
+        return False
+    
+    try:
+        from odoo.modules.registry import Registry
+        import odoo
+        
+        registry = Registry(odoo.tools.config.get('db_name'))
+        with registry.cursor() as cr:
+            cr.execute("""
+                SELECT 1
+                FROM webhook_log
+                WHERE record_key = %s
+                AND id < %s
+                AND status IN ('pending', 'queued', 'sending', 'retrying')
+                LIMIT 1
+            """, (key, log_id))
+            unfinished = bool(cr.fetchone())
+    except Exception as e:
+        _logger.error(f"Failed to check older webhooks of {key}: {e}")
+        return True
+    if not unfinished:
+        with _blocked_keys_lock:
+            if _blocked_keys.get(key) == blocker:
+                del _blocked_keys[key]
+    return unfinished
+
+
+def _blocked_values():
+    """Log values for a job waiting for an older log of the same record"""
+    return {'status': 'pending', 'next_retry_at': False}
+
+
+# Logs queued or being sent in this process, and when their lease was last renewed
+_held_logs = set()
+_held_logs_lock = threading.Lock()
+_lease_renewed_at = [0.0]
+
+
+def _hold_webhook_log(log_id):
+    if log_id:
+        with _held_logs_lock:
+            _held_logs.add(log_id)
+
+
+def _release_webhook_logs(log_ids):
+    with _held_logs_lock:
+        _held_logs.difference_update(log_ids)
+
+
+def _renew_webhook_leases(config):
+    """
+    Touch the logs held in memory by this process, at most three times per
+    lease timeout, so the stale sweeper does not re-queue rows that are
+    still waiting in a queue or being sent here. Workers call it whenever
+    they pick up a job; a process that died stops renewing and its rows
+    are swept.
+    """
+    now = time.monotonic()
+    with _held_logs_lock:
+        if now < _lease_renewed_at[0] + config['lease_timeout'] / 3.0 or not _held_logs:
+            return
+        _lease_renewed_at[0] = now
+        log_ids = tuple(_held_logs)
+    
+    try:
+        from odoo.modules.registry import Registry
+        import odoo
+        
+        registry = Registry(odoo.tools.config.get('db_name'))
+        with registry.cursor() as cr:
+            cr.execute("""
+                UPDATE webhook_log
+                SET write_date = (now() at time zone 'UTC')
+                WHERE id IN %s AND status IN ('queued', 'sending')
+            """, (log_ids,))
+            cr.commit()
+    except Exception as e:
+        _logger.error(f"Failed to renew the lease of {len(log_ids)} webhook logs: {e}")
+
+
+def _webhook_worker(payload, config, log_id=None, retry_count=0):
+    """
+    Worker function that makes a single delivery attempt.
+
+    Failed attempts are not retried in place: the log is marked as
+    ``retrying`` with ``next_retry_at`` and the scheduler hands it back to
+    the dispatcher once it is due, so no thread sleeps between attempts.
+    The intermediate ``sending`` state is not written; ``sent_at`` is stored
+    together with the outcome.
+    """
+    _renew_webhook_leases(config)
+    try:
+        if _is_superseded(payload, log_id, config):
+            _record_webhook_logs({log_id: _superseded_values()}, config)
+            return
+        if _is_blocked(payload, log_id, config):
+            # The scheduler claims it once the older log is finished
+            _record_webhook_logs({log_id: _blocked_values()}, config)
+            return
+        
+        values = _attempt_webhook(payload, config, retry_count)
+        _track_unfinished(_webhook_record_key(payload, config), log_id, values['status'])
+        _record_webhook_logs({log_id: values}, config)
+    finally:
+        _release_webhook_logs([log_id])
+
+
+def _webhook_batch_worker(jobs):
+    """Worker function that coalesces dispatcher jobs into batch POSTs"""
+    config = jobs[0][1]
+    _renew_webhook_leases(config)
+    try:
+        entries = []
+        held_back = {}
+        for payload, _config, log_id, retry_count in jobs:
+            if _is_superseded(payload, log_id, config):
+                held_back[log_id] = _superseded_values()
+            elif _is_blocked(payload, log_id, config):
+                held_back[log_id] = _blocked_values()
             else:
-                _logger.warning(f"Webhook failed: {response.reason}")
-                raise requests.exceptions.HTTPError(response.reason)
+                entries.append((log_id, payload, retry_count))
+        _record_webhook_logs(held_back, config)
+        
+        for chunk in _chunk_webhook_batch(entries, config['batch_size'], config['batch_max_bytes']):
+            values_by_id = _attempt_webhook_batch(chunk, config)
+            for log_id, payload, _retry_count in chunk:
+                _track_unfinished(_webhook_record_key(payload, config), log_id, values_by_id[log_id]['status'])
+            _record_webhook_logs(values_by_id, config)
+    finally:
+        _release_webhook_logs([log_id for _payload, _config, log_id, _retry_count in jobs])
 
-        except requests.exceptions.RequestException as e:
-            _logger.error(f"Webhook error: {e}")
-            
-            retry_count += 1
-            
-            # Check max retries (0 = unlimited)
-            if max_retries > 0 and retry_count >= max_retries:
-                _logger.error(f"Max retries ({max_retries}) reached, giving up")
-                
-                # Update log as error
-                if log_id:
-                    _update_webhook_log(log_id, {
-                        'status': 'error',
-                        'error_message': str(e),
-                        'retry_count': retry_count,
-                        'completed_at': datetime.now(),
-                        'duration_ms': duration_ms
-                    })
-                break
-            
-            # Update log as retrying
-            if log_id:
-                next_retry = datetime.now() + timedelta(seconds=retry_delay)
-                _update_webhook_log(log_id, {
-                    'status': 'retrying',
-                    'error_message': str(e),
-                    'retry_count': retry_count,
-                    'next_retry_at': next_retry
-                })
-            
-            _logger.info(f"Retrying in {retry_delay} seconds...")
-            time.sleep(retry_delay)
+
+def _submit_webhook(payload, config, log_id=None, retry_count=0):
+    """
+    Hand a webhook to the process dispatcher of its subscriber.
+    Returns False when the bounded queue is full.
+    """
+    batching = config['batch_enabled']
+    dispatcher = get_dispatcher(
+        _webhook_worker,
+        worker_count=config.get('worker_count', 4),
+        queue_size=config.get('queue_size', 1000),
+        batch_handler=_webhook_batch_worker,
+        batch_size=config['batch_size'] if batching else 1,
+        batch_window=config['batch_window_ms'] / 1000.0 if batching else 0,
+        name=config.get('subscriber_id') or 0,
+    )
+    _track_queued_update(payload, log_id, config)
+    _shutdown_settings['drain_timeout'] = config.get('drain_timeout', 10)
+    _hold_webhook_log(log_id)
+    submitted = dispatcher.submit(
+        (payload, config, log_id, retry_count),
+        key=_webhook_record_key(payload, config),
+        priority=_webhook_priority(payload),
+    )
+    if not submitted:
+        _untrack_queued_update(payload, log_id, config)
+        _release_webhook_logs([log_id])
+    return submitted
+
+
+def _submit_webhook_logs(jobs):
+    """
+    Hand (log, payload, target, retry_count) jobs to the dispatchers.
+    
+    A full queue only defers the events of its own subscriber: once it
+    overflows, the remaining jobs of that subscriber are not tried.
+    
+    :return: ids of the logs that did not fit, to be left to the scheduler
+    """
+    overflow = []
+    full = set()
+    for log, payload, target, retry_count in jobs:
+        subscriber_id = target['subscriber_id']
+        if subscriber_id in full or not _submit_webhook(payload, target, log.id, retry_count):
+            full.add(subscriber_id)
+            overflow.append(log.id)
+    return overflow
 
 
-def send_webhook(payload):
+def send_webhook(payload, env=None):
     """
-    Send webhook in a background thread.
+    Queue a webhook for delivery by the process dispatcher, with one log
+    per subscriber whose model and operation filters match.
     If configuration is not set or disabled, does nothing.
+    When the in-memory queue is full the log stays ``pending`` in the
+    database and is delivered by the scheduler.
+    
+    In outbox and standalone modes the log row is only inserted through
+    ``env``, inside the caller's transaction, and the outbox cron or the
+    standalone dispatcher sends it after commit. A
+    rolled back transaction therefore never sends anything. Without ``env``
+    the row is committed on its own cursor.
     """
     # Get configuration
     config = _get_webhook_config()
@@ -264,36 +996,148 @@ def send_webhook(payload):
         _logger.debug("Webhook not configured or disabled, skipping")
         return
     
+    targets = _webhook_targets(config, payload.get('model'), payload.get('operation', 0))
+    if not targets:
+        _logger.debug(f"No webhook subscriber for model: {payload.get('model')}, skipping")
+        return
+    
     # Sanitize payload
     payload = sanitize(payload)
     
-    _logger.info(f"Preparing to send webhook for model: {payload.get('model')}")
-    
-    # Create log entry
-    log_id = _create_webhook_log(payload, config)
+    _logger.info(f"Preparing to send webhook for model: {payload.get('model')} to {len(targets)} subscribers")
     
-    if not log_id:
-        _logger.error("Failed to create webhook log, aborting webhook send")
+    if config['delivery_mode'] in DEFERRED_DELIVERY_MODES:
+        if env is not None:
+            if config['delta_enabled'] and not env['webhook.record.version'].sudo()._apply_delta(payload):
+                return
+            env['webhook.log'].sudo().create([_prepare_webhook_log_vals(payload, target) for target in targets])
+        else:
+            _create_webhook_logs(payload, targets)
         return
     
-    _logger.info(f"Starting webhook worker thread for log_id: {log_id}")
+    # Create log entries
+    log_ids = _create_webhook_logs(payload, targets, status='queued')
     
-    # Send in background thread
-    thread = threading.Thread(target=_webhook_worker, args=(payload, config, log_id))
-    thread.daemon = True
-    thread.start()
+    if not log_ids:
+        _logger.info("No webhook log created, nothing to send")
+        return
+    
+    for target, log_id in zip(targets, log_ids):
+        if log_id and not _submit_webhook(payload, target, log_id):
+            _update_webhook_log(log_id, {'status': 'pending'})
 
 
-def send_webhook_with_log(payload, log_id=None):
+def send_webhook_with_log(payload, log_id=None, subscriber_id=False):
     """Send webhook with existing log ID (for manual retry)"""
     config = _get_webhook_config()
     if not config:
         return
     
     payload = sanitize(payload)
-    thread = threading.Thread(target=_webhook_worker, args=(payload, config, log_id))
-    thread.daemon = True
-    thread.start()
+    target = _webhook_target(config, subscriber_id)
+    if target is None:
+        _update_webhook_log(log_id, {'status': 'error', 'error_message': 'Webhook subscriber removed or inactive'})
+        return
+    if config['delivery_mode'] in DEFERRED_DELIVERY_MODES or not _submit_webhook(payload, target, log_id):
+        _update_webhook_log(log_id, {'status': 'pending', 'next_retry_at': False})
+
+def _insert_webhook_logs(env, payloads, config):
+    """
+    Insert the logs of several webhooks with one ``create`` on the cursor
+    of ``env``, without committing.
+    
+    :return: (jobs, logs) where jobs are the (payload, target) of the logs
+    """
+    events = []
+    for payload in payloads:
+        targets = _webhook_targets(config, payload.get('model'), payload.get('operation', 0))
+        if targets:
+            events.append((sanitize(payload), targets))
+    if config['delta_enabled']:
+        versions = env['webhook.record.version'].sudo()
+        events = [(payload, targets) for payload, targets in events if versions._apply_delta(payload)]
+    
+    deferred = config['delivery_mode'] in DEFERRED_DELIVERY_MODES
+    jobs = [(payload, target) for payload, targets in events for target in targets]
+    logs = env['webhook.log'].sudo().create([
+        _prepare_webhook_log_vals(payload, target, 'pending' if deferred else 'queued')
+        for payload, target in jobs
+    ])
+    return jobs, logs
+
+
+def send_webhooks(env, payloads):
+    """
+    Queue several webhooks at once, e.g. the changes captured in a
+    transaction. All logs are inserted with one ``create`` and committed
+    on the cursor of ``env`` before being handed to the dispatchers.
+    """
+    config = _get_webhook_config()
+    if not config or not payloads:
+        return
+    
+    jobs, logs = _insert_webhook_logs(env, payloads, config)
+    if not logs:
+        return
+    
+    deferred = config['delivery_mode'] in DEFERRED_DELIVERY_MODES
+    parked = logs.browse() if deferred else logs._park_behind_older()
+    env.cr.commit()
+    _logger.info(f"Queued {len(logs)} webhooks")
+    
+    if deferred:
+        return
+    
+    overflow = logs.browse(_submit_webhook_logs([
+        (log, payload, target, 0)
+        for (payload, target), log in zip(jobs, logs)
+        if log not in parked
+    ]))
+    if overflow:
+        overflow.write({'status': 'pending'})
+        env.cr.commit()
+
+def shutdown_webhook_dispatcher(timeout=30):
+    """
+    Stop the dispatchers of this process gracefully: wait up to ``timeout``
+    seconds for queued and in-flight jobs, put the unfinished ones back to
+    ``pending`` and flush the buffered log updates.
+    """
+    deadline = time.time() + timeout
+    dispatchers = current_dispatchers()
+    for dispatcher in dispatchers:
+        dispatcher.retire()
+    leftover = []
+    for dispatcher in dispatchers:
+        leftover += dispatcher.drain(max(0, deadline - time.time()))
+    if leftover:
+        _logger.info(f"Returning {len(leftover)} undelivered webhooks to the database")
+        _update_webhook_logs({job[2]: {'status': 'pending', 'next_retry_at': False} for job in leftover})
+    
+    writer = current_log_writer()
+    if writer is not None:
+        writer.flush()
+
+# Drain timeout of the active configuration, read at process exit
+_shutdown_settings = {'drain_timeout': 10}
+
+
+def _shutdown_at_exit():
+    """
+    Drain the dispatchers when the process exits normally, e.g. when a
+    prefork worker is recycled or the server is stopped. Their threads are
+    daemons and would otherwise die in the middle of a send, leaving logs
+    stuck in ``queued``. Killed processes are covered by the stale log
+    sweeper.
+    """
+    try:
+        shutdown_webhook_dispatcher(_shutdown_settings['drain_timeout'])
+    except Exception:
+        _logger.exception("Failed to drain webhook dispatchers at exit")
+
+
+atexit.register(_shutdown_at_exit)
+
 
 def get_sync_config():
     """Get the active sync app configuration"""
@@ -333,8 +1177,8 @@ def _create_checkpoint_log(checkpoint_name, data):
                 'model': checkpoint_name,
                 'operation': operation_value,
                 'record_ids': str(data.get('product_ids', [])),
-                'payload': json.dumps(payload, indent=2),
-                'headers': json.dumps({'checkpoint': True}, indent=2),
+                'payload': json.dumps(payload, separators=(',', ':'), default=str),
+                'headers': json.dumps({'checkpoint': True}, separators=(',', ':')),
                 'status': 'success',
                 'max_retries': 0,
             })
@@ -1159,15 +2003,8 @@ class PosSyncController(http.Controller):
     # this is the to sync orders so that order from the application is send to the odoo and can be stored and tracked also include creating 
     # account.move 
     @http.route('/pos/sync_orders', type='json', auth='public', methods=['POST'])
+    @token_required
     def sync_orders(self):
-        
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return {'error': 'Unauthorized or token expired'}, 401
-        
-
         user_id = self.get_user_id_by_name("App")
         if not user_id:
             return {"status": "error", "message": "User named 'App' not found"}
@@ -1356,13 +2193,8 @@ class PosSyncController(http.Controller):
 
     # this is the refunded_orders you can refund by normal or by all 
     @http.route('/pos/refund_orders', type='json', auth='public', methods=['POST'])
+    @token_required
     def refund_orders(self):
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return {'error': 'Unauthorized or token expired'}, 401
-        
         user_id = self.get_user_id_by_name("App")
         if not user_id:
             return {"status": "error", "message": "User named 'App' not found"}
@@ -1569,6 +2401,7 @@ class PosSyncController(http.Controller):
 
 
     @http.route('/api/sales/create_order', type='json', auth='public', methods=['POST'])
+    @token_required
     def create_sale_order(self):
         """
         Create a sale order, create invoice, and register payment
@@ -1600,12 +2433,6 @@ class PosSyncController(http.Controller):
             ]
         }
         """
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return {'error': 'Unauthorized or token expired'}, 401
-
         try:
             data = json.loads(request.httprequest.data)
             orders = data.get('orders', [])
@@ -2078,6 +2905,7 @@ class PosSyncController(http.Controller):
 
 
     @http.route('/api/sales/return_order', type='json', auth='public', methods=['POST'])
+    @token_required
     def return_sale_order(self):
         """
         Return a sale order and create credit note
@@ -2100,12 +2928,6 @@ class PosSyncController(http.Controller):
             ]
         }
         """
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return {'error': 'Unauthorized or token expired'}, 401
-
         try:
             data = json.loads(request.httprequest.data)
             returns = data.get('returns', [])
@@ -2281,26 +3103,53 @@ class PosSyncController(http.Controller):
 
 
     
+    def _get_sync_watermark(self, scope, kwargs):
+        """
+        Time of the caller's previous ``scope`` sync: from the ``cursor`` it
+        sent back, else from the cursor stored for its ``client_id``, else
+        from the watermark shared by every client in sync.update.
+        
+        :raise ValueError: if the cursor is invalid
+        """
+        if 'cursor' in kwargs:
+            return decode_sync_cursor(request.env, scope, kwargs['cursor'])
+        if kwargs.get('client_id'):
+            return request.env['sync.client.cursor'].sudo()._get_last_sync(request.api_user, kwargs['client_id'], scope)
+        return request.env['sync.update'].sudo().get_sync_record()[f'last_{scope}_sync']
+    
+    def _save_sync_watermark(self, scope, kwargs, current_time):
+        """
+        Record ``current_time`` where ``_get_sync_watermark`` found the
+        previous one; clients using cursors need nothing stored.
+        
+        :return: cursor of the next sync
+        """
+        if 'cursor' not in kwargs:
+            if kwargs.get('client_id'):
+                request.env['sync.client.cursor'].sudo()._set_last_sync(
+                    request.api_user, kwargs['client_id'], scope, current_time
+                )
+            else:
+                request.env['sync.update'].sudo().get_sync_record().write({f'last_{scope}_sync': current_time})
+        return encode_sync_cursor(request.env, scope, current_time)
+    
     @http.route('/api/sync/product', type='http', auth='none', methods=['GET'], csrf=False)
+    @token_required
     def get_product_sync(self, **kwargs):
         """
         Get all products changed since last sync.
         Returns created, updated, and deleted products.
-        """
-        # Check token
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return request.make_response(
-                json.dumps({'error': 'Unauthorized or token expired', 'status': 401}),
-                headers=[('Content-Type', 'application/json')],
-                status=401
-            )
         
-        # Get sync tracker
-        sync_record = request.env['sync.update'].sudo().get_sync_record()
-        last_sync = sync_record.last_product_sync
+        Every terminal should send back the ``next_cursor`` of its previous
+        response as ``?cursor=...`` (empty for a full sync), or identify
+        itself with ``?client_id=...``, so it gets the changes since its own
+        last sync. Without either, the watermark shared by all clients is
+        used.
+        """
+        try:
+            last_sync = self._get_sync_watermark('product', kwargs)
+        except ValueError as e:
+            return request.make_json_response({'error': str(e), 'status': 400}, status=400)
         current_time = datetime.utcnow()
         
         # Build the query
@@ -2365,6 +3214,14 @@ class PosSyncController(http.Controller):
         
         raw_results = request.env.cr.dictfetchall()
         
+        # With delta webhooks, tell the receiver which version each product is at
+        versions = {}
+        config = get_sync_config()
+        if config and config.webhook_delta_enabled:
+            versions = request.env['webhook.record.version'].sudo()._get_versions(
+                'product.template', list({row['id'] for row in raw_results})
+            )
+        
         # Format results
         created = []
         updated = []
@@ -2402,6 +3259,8 @@ class PosSyncController(http.Controller):
                 'ids': [row['id']],
                 'data': data
             }
+            if versions:
+                payload['version'] = versions.get(row['id'], 0)
             
             if row['change_type'] == 'created':
                 created.append(payload)
@@ -2409,13 +3268,14 @@ class PosSyncController(http.Controller):
                 updated.append(payload)
         
         # Update last sync time
-        sync_record.sudo().write({'last_product_sync': current_time})
+        next_cursor = self._save_sync_watermark('product', kwargs, current_time)
         
         # Build response
         response = {
             'success': True,
             'last_sync_time': last_sync.isoformat() if last_sync else None,
             'current_sync_time': current_time.isoformat(),
+            'next_cursor': next_cursor,
             'changes': {
                 'created': created,
                 'updated': updated,
@@ -2436,20 +3296,25 @@ class PosSyncController(http.Controller):
         )        
 
     @http.route('/api/sync/loyalty', type='http', auth='none', methods=['GET'], csrf=False)
+    @token_required
     def get_loyalty_sync(self, **kwargs):
         """
         Get all loyalty programs changed since last sync.
         Returns created, updated, and deleted loyalty programs.
         
         Request:
-        GET /api/sync/loyalty
+        GET /api/sync/loyalty?cursor=<next_cursor of the previous call>
         Headers: Authorization: your-token
         
+        ``cursor`` is empty for a full sync. Clients may send ``client_id``
+        instead to have their cursor stored, see get_product_sync.
+        
         Response:
         {
             "success": true,
             "last_sync_time": "2024-01-01T00:00:00",
             "current_sync_time": "2024-01-02T00:00:00",
+            "next_cursor": "...",
             "changes": {
                 "created": [...],
                 "updated": [...],
@@ -2463,21 +3328,12 @@ class PosSyncController(http.Controller):
             }
         }
         """
-        # Check token
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return request.make_response(
-                json.dumps({'error': 'Unauthorized or token expired', 'status': 401}),
-                headers=[('Content-Type', 'application/json')],
-                status=401
-            )
+        try:
+            last_sync = self._get_sync_watermark('loyalty', kwargs)
+        except ValueError as e:
+            return request.make_json_response({'error': str(e), 'status': 400}, status=400)
 
         try:
-            # Get sync tracker
-            sync_record = request.env['sync.update'].sudo().get_sync_record()
-            last_sync = sync_record.last_loyalty_sync
             current_time = datetime.utcnow()
 
             # Build the query
@@ -2746,13 +3602,14 @@ class PosSyncController(http.Controller):
                     updated.append(payload)
 
             # Update last sync time
-            sync_record.sudo().write({'last_loyalty_sync': current_time})
+            next_cursor = self._save_sync_watermark('loyalty', kwargs, current_time)
 
             # Build response
             response = {
                 'success': True,
                 'last_sync_time': last_sync.isoformat() if last_sync else None,
                 'current_sync_time': current_time.isoformat(),
+                'next_cursor': next_cursor,
                 'changes': {
                     'created': created,
                     'updated': updated,
@@ -2819,6 +3676,8 @@ class PosSyncController(http.Controller):
             })
 
     @http.route('/api/loyalty/all', type='http', auth='none', methods=['GET'], csrf=False)
+    @token_required
+    @rate_limited
     def get_all_loyalty_programs(self, **kwargs):
         """
         Get all loyalty programs (both active and inactive) with complete details.
@@ -2833,15 +3692,6 @@ class PosSyncController(http.Controller):
             "count": 10
         }
         """
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return request.make_json_response(
-                {'error': 'Unauthorized or token expired', 'status': 401},
-                status=401
-            )
-
         try:
             query = """
                 SELECT
@@ -3049,6 +3899,7 @@ class PosSyncController(http.Controller):
     
     
     @http.route('/api/promotions/all', type='http', auth='none', methods=['GET'], csrf=False)
+    @token_required
     def get_all_promotions(self, **kwargs):
         """
         Get all active promotions (discount-based loyalty programs)
@@ -3056,12 +3907,6 @@ class PosSyncController(http.Controller):
         This specifically filters for discount-type programs that can be
         used as promotions in the POS system.
         """
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return {'error': 'Unauthorized or token expired', 'status': 401}
-
         try:
             query = """
                 SELECT
@@ -3134,6 +3979,8 @@ class PosSyncController(http.Controller):
         
 
     @http.route('/api/products/all', type='http', auth='none', methods=['GET'], csrf=False)
+    @token_required
+    @rate_limited
     def get_all_products(self, **kwargs):
         """
         Get products with pagination
@@ -3142,16 +3989,6 @@ class PosSyncController(http.Controller):
         - limit: Number of products per page (default: 1000, max: 5000)
         - offset: Starting position (default: 0)
         """
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return request.make_response(
-                json.dumps({'error': 'Unauthorized or token expired', 'status': 401}),
-                headers=[('Content-Type', 'application/json')],
-                status=401
-            )
-
         try:
             # Parse limit and offset from query params
             limit = min(int(kwargs.get('limit', 1000)), 5000)  # Cap at 5000
@@ -3271,6 +4108,7 @@ class PosSyncController(http.Controller):
 
 
     @http.route('/api/loyalty/programs/<int:program_id>', type='json', auth='public', methods=['GET'])
+    @token_required
     def get_loyalty_program_by_id(self, program_id, **kwargs):
         """
         Get a specific loyalty program by ID with complete details
@@ -3286,12 +4124,6 @@ class PosSyncController(http.Controller):
             "count": 3
         }
         """
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return {'error': 'Unauthorized or token expired', 'status': 401}
-
         try:
             # Execute query filtered by program_id
             query = """
@@ -3414,6 +4246,7 @@ class PosSyncController(http.Controller):
 
         
     @http.route('/api/product/delivery-cost/create', type='json', auth='public', methods=['POST'])
+    @token_required
     def create_delivery_cost_product(self):
         """
         Create a delivery cost product
@@ -3439,12 +4272,6 @@ class PosSyncController(http.Controller):
             }
         }
         """
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-        
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return {'error': 'Unauthorized or token expired', 'status': 401}
-        
         try:
             # For type='json', read data from request body
             data = json.loads(request.httprequest.data)
@@ -3489,6 +4316,7 @@ class PosSyncController(http.Controller):
             }
 
     @http.route('/api/products/prices', type='json', auth='public', methods=['GET'])
+    @token_required
     def get_product_prices(self, **kwargs):
         """
         Get all products with template_id, prices, and last update time
@@ -3513,12 +4341,6 @@ class PosSyncController(http.Controller):
             "count": 100
         }
         """
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return {'error': 'Unauthorized or token expired', 'status': 401}
-
         try:
             # Query to get product template, prices, and last update
             query = """
@@ -3574,16 +4396,49 @@ class PosSyncController(http.Controller):
 
         user = request.env['auth.user.token'].sudo().search([('name', '=', username)], limit=1)
         if user and user.check_password(password):
-            token = secrets.token_hex(32)
-            expiration = datetime.utcnow() + timedelta(hours=24)
-            user.sudo().write({'token': token, 'token_expiration': expiration})
-            return {'token': token, 'expires_at': expiration.isoformat()}
+            # Every login gets its own session, so devices sharing the
+            # credentials do not log each other out
+            settings = get_token_settings(request.env)
+            return request.env['auth.user.token.session'].sudo()._open(user, settings, params.get('device'))
         return {'error': 'Invalid credentials'}, 401    
+
+    @http.route('/api/auth/refresh', type='json', auth='public', methods=['POST'])
+    def refresh_token(self):
+        """
+        Renew the token of a session without the password.
+        
+        Request body:
+        {"refresh_token": "..."}
+        
+        Response: same as /api/auth/token, with a new refresh token that
+        replaces the one sent.
+        """
+        params = json.loads(request.httprequest.data or '{}')
+        session = request.env['auth.user.token.session'].sudo()._find_by_refresh_token(params.get('refresh_token'))
+        if not session:
+            return {'error': 'Invalid or expired refresh token', 'status': 401}
+        return session._refresh(get_token_settings(request.env))
+
+    @http.route('/api/auth/revoke', type='json', auth='public', methods=['POST'])
+    @token_required
+    def revoke_token(self):
+        """
+        Revoke the token of the call, e.g. when a device logs out. Signed
+        tokens are added to the revocation list until they expire. The
+        session of the ``refresh_token`` sent in the body, if any, is closed.
+        """
+        request.api_user._revoke_token(request.httprequest.headers.get('Authorization'))
+        params = json.loads(request.httprequest.data or '{}')
+        session = request.env['auth.user.token.session'].sudo()._find_by_refresh_token(params.get('refresh_token'))
+        if session.user_id == request.api_user:
+            session.unlink()
+        return {'status': 'success'}
     
 
 
 
     @http.route('/api/invoice/<int:invoice_id>', type='json', auth='public', methods=['GET'])
+    @token_required
     def get_invoice_by_id(self, invoice_id, **kwargs):
         """
         Get invoice by ID with ZATCA delivery status
@@ -3607,12 +4462,6 @@ class PosSyncController(http.Controller):
             }
         }
         """
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-        
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return {'error': 'Unauthorized or token expired', 'status': 401}
-        
         try:
             # Query invoice with ZATCA status
             query = """
@@ -3665,6 +4514,7 @@ class PosSyncController(http.Controller):
 
 
     @http.route('/api/invoice/<int:invoice_id>/pdf', type='http', auth='public', methods=['GET'])
+    @token_required
     def get_invoice_pdf(self, invoice_id, **kwargs):
         """
         Get invoice PDF by ID
@@ -3676,15 +4526,6 @@ class PosSyncController(http.Controller):
         Response:
         PDF file download
         """
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-        
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return request.make_json_response({
-                'error': 'Unauthorized or token expired',
-                'status': 401
-            }, status=401)
-        
         try:
             # Find the invoice
             invoice = request.env['account.move'].sudo().search([
@@ -3720,6 +4561,118 @@ class PosSyncController(http.Controller):
                 'status': 500
             }, status=500)    
         
+    @http.route('/api/webhook/replay', type='json', auth='public', methods=['POST'])
+    @token_required
+    def replay_webhooks(self):
+        """
+        Replay failed webhooks in the background, at a throttled rate
+        
+        Request:
+        POST /api/webhook/replay
+        Headers: Authorization: your-token
+        Body (all optional):
+        {
+            "status": "error",
+            "model": "product.template",
+            "subscriber_id": 3,
+            "date_from": "2024-12-22 00:00:00",
+            "date_to": "2024-12-23 00:00:00",
+            "log_ids": [101, 102],
+            "rate_per_minute": 500
+        }
+        
+        Response:
+        {
+            "status": "success",
+            "data": {"id": 7, "state": "running", "total": 1250, "processed": 0, ...}
+        }
+        """
+        try:
+            data = json.loads(request.httprequest.data or '{}')
+            
+            vals = {
+                'name': f"API replay by {request.api_user.name}",
+                'log_status': data.get('status') or 'error',
+                'model': data.get('model') or False,
+                'subscriber_id': data.get('subscriber_id') or False,
+                'date_from': fields.Datetime.to_datetime(data.get('date_from')) or False,
+                'date_to': fields.Datetime.to_datetime(data.get('date_to')) or False,
+            }
+            if data.get('log_ids'):
+                vals['log_ids'] = [(6, 0, [int(log_id) for log_id in data['log_ids']])]
+            if data.get('rate_per_minute'):
+                vals['rate_per_minute'] = int(data['rate_per_minute'])
+            
+            job = request.env['webhook.replay.job'].sudo().create(vals)
+            job.action_start()
+            
+            _logger.info(f"✅ Webhook replay {job.id} started - {job.total_count} logs")
+            
+            return {
+                'status': 'success',
+                'data': job._get_progress()
+            }
+        
+        except Exception as e:
+            _logger.exception("Failed to start webhook replay")
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+
+    @http.route('/api/webhook/stats', type='json', auth='public', methods=['GET'])
+    @token_required
+    def get_webhook_stats(self, **kwargs):
+        """
+        Get the latest webhook delivery statistics, per URL and per model
+        
+        Request:
+        GET /api/webhook/stats
+        Headers: Authorization: your-token
+        
+        Response:
+        {
+            "status": "success",
+            "data": {
+                "snapshot_at": "2024-12-22T10:05:00",
+                "window_minutes": 15,
+                "url": [{"key": "https://...", "p50_ms": 120.0, "p95_ms": 480.0, "p99_ms": 900.0,
+                         "success_rate": 99.5, "deliveries_per_minute": 42.0,
+                         "queue_depth": 12, "oldest_pending_age": 35, ...}],
+                "model": [...]
+            }
+        }
+        """
+        return {
+            'status': 'success',
+            'data': request.env['webhook.stats'].sudo()._get_latest()
+        }
+
+    @http.route('/api/webhook/replay/<int:job_id>', type='json', auth='public', methods=['GET'])
+    @token_required
+    def get_webhook_replay(self, job_id, **kwargs):
+        """
+        Get the progress of a webhook replay
+        
+        Request:
+        GET /api/webhook/replay/7
+        Headers: Authorization: your-token
+        
+        Response:
+        {
+            "status": "success",
+            "data": {"id": 7, "state": "running", "total": 1250, "processed": 600, "progress": 48.0, ...}
+        }
+        """
+        job = request.env['webhook.replay.job'].sudo().browse(job_id).exists()
+        if not job:
+            return {'status': 'error', 'message': f'Replay {job_id} not found'}
+        
+        return {
+            'status': 'success',
+            'data': job._get_progress()
+        }
+
 
 
 
@@ -4409,15 +5362,9 @@ class PurchaseOrderReceivingController(http.Controller):
 
 
     @http.route('/api/purchase/order/<string:po_name>', type='json', auth='public', methods=['GET'])
+    @token_required
     def get_purchase_order_details(self, po_name):
         """Get purchase order details for receiving"""
-        # Verify token
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return {'error': 'Unauthorized or token expired'}, 401
-
         try:
             purchase_order = request.env['purchase.order'].sudo().search([
                 ('name', '=', po_name)
@@ -4568,21 +5515,10 @@ class StockReceivingController(http.Controller):
     
     
     @http.route('/api/sync/transfer', type='http', auth='public', methods=['GET'], csrf=False)
+    @token_required
     def get_transfer_details(self, **kwargs):
         """Get stock transfer/picking details for processing"""
         import json
-        
-        # Verify token
-        token = request.httprequest.headers.get('Authorization')
-        user = request.env['auth.user.token'].sudo().search([('token', '=', token)], limit=1)
-
-        if not user or not user.token_expiration or user.token_expiration < datetime.utcnow():
-            return request.make_response(
-                json.dumps({'error': 'Unauthorized or token expired'}),
-                status=401,
-                headers={'Content-Type': 'application/json'}
-            )
-
         # Get transfer name from query parameter
         transfer_name = kwargs.get('name')
         
@@ -59,6 +59,56 @@ class SyncAppConfig(models.Model):
         help='The journal used for Sales order payments'
     )
     
+    # ============================================
+    # API TOKEN CONFIGURATION
+    # ============================================
+    api_token_mode = fields.Selection([
+        ('random', 'Random (stored)'),
+        ('signed', 'Signed (stateless)'),
+    ], string='Token Mode', default='random', required=True,
+        help='Random: tokens are stored and looked up on each call. '
+             'Signed: tokens carry the user and expiry and are verified in memory; '
+             'revoked ones are listed in API Token Revocations'
+    )
+    
+    api_token_lifetime = fields.Integer(
+        string='Token Lifetime (hours)',
+        default=24,
+        help='Validity of the tokens issued by /api/auth/token'
+    )
+    
+    api_refresh_token_lifetime = fields.Integer(
+        string='Refresh Token Lifetime (days)',
+        default=30,
+        help='A device can renew its token through /api/auth/refresh during this '
+             'period without logging in again; each refresh extends it'
+    )
+    
+    api_rate_limit = fields.Float(
+        string='Rate Limit (calls/second)',
+        default=0.0,
+        help='Average calls per second allowed to each token on heavy endpoints (0 = unlimited)'
+    )
+    
+    api_rate_burst = fields.Integer(
+        string='Rate Burst',
+        default=10,
+        help='Calls a token may make at once before the rate limit applies'
+    )
+    
+    api_rate_limit_shared = fields.Boolean(
+        string='Share Rate Limits',
+        default=False,
+        help='Count calls in the database so the limit holds across all workers, '
+             'at the cost of one statement per call; otherwise each worker counts on its own'
+    )
+    
+    api_max_concurrent = fields.Integer(
+        string='Max Concurrent Calls',
+        default=0,
+        help='Calls of each heavy endpoint running at once per worker (0 = unlimited)'
+    )
+    
     # ============================================
     # WEBHOOK CONFIGURATION
     # ============================================
@@ -85,6 +135,36 @@ class SyncAppConfig(models.Model):
         help='Delay in seconds before retrying a failed webhook'
     )
     
+    webhook_retry_max_delay = fields.Integer(
+        string='Max Retry Delay (seconds)',
+        default=3600,
+        help='Upper bound of the exponential backoff between retries'
+    )
+    
+    webhook_breaker_threshold = fields.Integer(
+        string='Circuit Breaker Threshold',
+        default=5,
+        help='Consecutive failures after which deliveries to the URL are paused (0 = disabled)'
+    )
+    
+    webhook_breaker_cooldown = fields.Integer(
+        string='Circuit Breaker Cooldown (seconds)',
+        default=60,
+        help='Time the circuit stays open before a single probe request is sent'
+    )
+    
+    webhook_breaker_state = fields.Selection([
+        ('closed', 'Closed'),
+        ('open', 'Open'),
+        ('half_open', 'Half Open'),
+    ], string='Circuit State', compute='_compute_webhook_breaker',
+        help='Circuit breaker state last reported by the processes sending webhooks')
+    
+    webhook_breaker_failures = fields.Integer(
+        string='Consecutive Failures',
+        compute='_compute_webhook_breaker'
+    )
+    
     webhook_max_retries = fields.Integer(
         string='Max Retries',
         default=0,
@@ -97,11 +177,168 @@ class SyncAppConfig(models.Model):
         help='Verify SSL certificates'
     )
     
+    webhook_subscriber_ids = fields.One2many(
+        'webhook.subscriber',
+        'config_id',
+        string='Subscribers',
+        help='Additional receivers, each with its own model and operation filters. '
+             'The Webhook URL above, when set, receives every event'
+    )
+    
     webhook_auth_token = fields.Char(
         string='Auth Token',
         help='Optional Bearer token for authentication'
     )
     
+    webhook_gzip_min_bytes = fields.Integer(
+        string='Gzip Bodies Above (bytes)',
+        default=0,
+        help='Send request bodies of at least this size gzip-compressed '
+             'with a Content-Encoding header (0 = never)'
+    )
+    
+    webhook_log_compress_min_bytes = fields.Integer(
+        string='Compress Logged Payloads Above (bytes)',
+        default=0,
+        help='Store logged payloads of at least this size zlib-compressed (0 = never)'
+    )
+    
+    webhook_pool_connections = fields.Integer(
+        string='Connection Pools',
+        default=4,
+        help='Number of per-host connection pools kept by the webhook HTTP session'
+    )
+    
+    webhook_pool_maxsize = fields.Integer(
+        string='Connections per Pool',
+        default=10,
+        help='Maximum keep-alive connections reused for the webhook receiver'
+    )
+    
+    webhook_rate_limit = fields.Float(
+        string='Rate Limit (requests/second)',
+        default=0,
+        help='Average number of requests per second sent to the webhook URL by each '
+             'Odoo process (0 = unlimited)'
+    )
+    
+    webhook_rate_burst = fields.Integer(
+        string='Rate Burst',
+        default=10,
+        help='Requests that may be sent at once before the rate limit applies'
+    )
+    
+    webhook_max_in_flight = fields.Integer(
+        string='Max In-Flight Requests',
+        default=0,
+        help='Maximum concurrent requests to the webhook URL per Odoo process (0 = unlimited)'
+    )
+    
+    webhook_delivery_mode = fields.Selection([
+        ('dispatcher', 'Immediate'),
+        ('outbox', 'Transactional Outbox'),
+        ('standalone', 'Standalone Dispatcher'),
+    ], string='Delivery Mode', default='dispatcher', required=True,
+        help='Immediate: queued to this process right away. '
+             'Transactional Outbox: stored with the triggering transaction and sent by the scheduler. '
+             'Standalone Dispatcher: stored with the triggering transaction and sent by a separate '
+             '"odoo-bin webhook_dispatcher" process')
+    
+    webhook_outbox_batch_size = fields.Integer(
+        string='Outbox Batch Size',
+        default=100,
+        help='Number of outbox rows claimed per transaction by the scheduler'
+    )
+    
+    webhook_batch_enabled = fields.Boolean(
+        string='Batch Delivery',
+        default=False,
+        help='Coalesce events into a single POST carrying a JSON array. '
+             'Each event keeps its own log and status'
+    )
+    
+    webhook_batch_size = fields.Integer(
+        string='Batch Size',
+        default=50,
+        help='Maximum number of events per batch'
+    )
+    
+    webhook_batch_max_bytes = fields.Integer(
+        string='Batch Max Bytes',
+        default=262144,
+        help='Approximate maximum JSON size of a batch'
+    )
+    
+    webhook_batch_window_ms = fields.Integer(
+        string='Batch Window (ms)',
+        default=500,
+        help='How long a worker waits for more events before sending a batch'
+    )
+    
+    webhook_log_flush_interval = fields.Integer(
+        string='Log Flush Interval (seconds)',
+        default=2,
+        help='Delivery results are buffered and written to the webhook logs '
+             'in one transaction at this interval (0 = write each result immediately)'
+    )
+    
+    webhook_worker_count = fields.Integer(
+        string='Dispatcher Workers',
+        default=4,
+        help='Number of delivery threads per Odoo process. Events of one record '
+             'are delivered in order by the same thread, so this is also the number '
+             'of records delivered concurrently'
+    )
+    
+    webhook_drain_timeout = fields.Integer(
+        string='Shutdown Drain Timeout (seconds)',
+        default=10,
+        help='When an Odoo process stops, how long it waits for queued and in-flight '
+             'webhooks before returning the rest to the database'
+    )
+    
+    webhook_lease_timeout = fields.Integer(
+        string='Stale Lease Timeout (seconds)',
+        default=600,
+        help='Webhooks left queued or sending for longer than this, e.g. by a killed '
+             'worker, are re-queued by the sweeper'
+    )
+    
+    webhook_queue_size = fields.Integer(
+        string='Queue Size',
+        default=1000,
+        help='Maximum webhooks held in memory per process. '
+             'Overflow stays pending in the database and is sent by the scheduler'
+    )
+    
+    webhook_delta_enabled = fields.Boolean(
+        string='Delta Payloads',
+        default=False,
+        help='Send only the fields changed since the previous version of a record, '
+             'with a version number so the receiver can detect gaps and resync'
+    )
+    
+    # ============================================
+    # WEBHOOK LOG RETENTION
+    # ============================================
+    webhook_log_keep_success_days = fields.Integer(
+        string='Keep Successful Logs (days)',
+        default=30,
+        help='Successful and superseded webhook logs older than this are pruned (0 = keep forever)'
+    )
+    
+    webhook_log_keep_error_days = fields.Integer(
+        string='Keep Failed Logs (days)',
+        default=90,
+        help='Failed webhook logs older than this are pruned (0 = keep forever)'
+    )
+    
+    webhook_log_archive = fields.Boolean(
+        string='Archive Before Pruning',
+        default=False,
+        help='Store pruned logs as compressed files in Webhook Log Archives'
+    )
+    
     # ============================================
     # WAREHOUSE CONTACT MAPPINGS
     # ============================================
@@ -122,6 +359,45 @@ class SyncAppConfig(models.Model):
         help='The sales team used for App operations'
     )
     
+    # ============================================
+    # COMPUTE
+    # ============================================
+    def _compute_webhook_breaker(self):
+        states = self.env['webhook.breaker.state'].sudo()
+        for record in self:
+            if not record.webhook_url:
+                record.webhook_breaker_state = 'closed'
+                record.webhook_breaker_failures = 0
+                continue
+            record.webhook_breaker_state, record.webhook_breaker_failures = states._get(record.webhook_url)
+    
+    # ============================================
+    # CRUD
+    # ============================================
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._invalidate_webhook_config()
+        return records
+    
+    def write(self, vals):
+        result = super().write(vals)
+        self._invalidate_webhook_config()
+        return result
+    
+    def unlink(self):
+        result = super().unlink()
+        self._invalidate_webhook_config()
+        return result
+    
+    def _invalidate_webhook_config(self):
+        """Drop the cached webhook and token settings here and signal the other workers"""
+        from .auth_user_token import signal_token_change
+        from .cus_models import invalidate_webhook_config_cache
+        invalidate_webhook_config_cache(self.env.cr.dbname)
+        signal_token_change(self.env)
+        self.clear_caches()
+    
     # ============================================
     # CONSTRAINTS
     # ============================================
@@ -136,17 +412,98 @@ class SyncAppConfig(models.Model):
                 if other_active:
                     raise ValidationError('Only one active configuration is allowed.')
     
+    @api.constrains('api_token_lifetime', 'api_refresh_token_lifetime')
+    def _check_api_token_lifetime(self):
+        for record in self:
+            if record.api_token_lifetime < 1:
+                raise ValidationError('Token lifetime must be at least 1 hour')
+            if record.api_refresh_token_lifetime * 24 < record.api_token_lifetime:
+                raise ValidationError('Refresh tokens must live at least as long as tokens')
+    
+    @api.constrains('api_rate_limit', 'api_rate_burst', 'api_max_concurrent')
+    def _check_api_rate_limit(self):
+        for record in self:
+            if record.api_rate_limit < 0:
+                raise ValidationError('API rate limit cannot be negative')
+            if record.api_rate_burst < 1:
+                raise ValidationError('API rate burst must be at least 1')
+            if record.api_max_concurrent < 0:
+                raise ValidationError('Max concurrent calls cannot be negative')
+    
     @api.constrains('webhook_timeout')
     def _check_webhook_timeout(self):
         for record in self:
             if record.webhook_timeout and record.webhook_timeout < 1:
                 raise ValidationError('Webhook timeout must be at least 1 second')
     
-    @api.constrains('webhook_retry_delay')
+    @api.constrains('webhook_retry_delay', 'webhook_retry_max_delay')
     def _check_webhook_retry_delay(self):
         for record in self:
             if record.webhook_retry_delay and record.webhook_retry_delay < 1:
                 raise ValidationError('Retry delay must be at least 1 second')
+            if record.webhook_retry_max_delay < record.webhook_retry_delay:
+                raise ValidationError('Max retry delay cannot be lower than the retry delay')
+    
+    @api.constrains('webhook_worker_count', 'webhook_queue_size', 'webhook_outbox_batch_size',
+                    'webhook_log_flush_interval', 'webhook_drain_timeout', 'webhook_lease_timeout')
+    def _check_webhook_dispatcher(self):
+        for record in self:
+            if record.webhook_worker_count < 1:
+                raise ValidationError('Dispatcher workers must be at least 1')
+            if record.webhook_queue_size < 1:
+                raise ValidationError('Queue size must be at least 1')
+            if record.webhook_outbox_batch_size < 1:
+                raise ValidationError('Outbox batch size must be at least 1')
+            if record.webhook_log_flush_interval < 0:
+                raise ValidationError('Log flush interval cannot be negative')
+            if record.webhook_drain_timeout < 0:
+                raise ValidationError('Drain timeout cannot be negative')
+            if record.webhook_lease_timeout < 60:
+                raise ValidationError('Stale lease timeout must be at least 60 seconds')
+    
+    @api.constrains('webhook_batch_size', 'webhook_batch_max_bytes', 'webhook_batch_window_ms')
+    def _check_webhook_batch(self):
+        for record in self:
+            if record.webhook_batch_size < 1:
+                raise ValidationError('Batch size must be at least 1')
+            if record.webhook_batch_max_bytes < 1024:
+                raise ValidationError('Batch max bytes must be at least 1024')
+            if record.webhook_batch_window_ms < 0:
+                raise ValidationError('Batch window cannot be negative')
+    
+    @api.constrains('webhook_breaker_threshold', 'webhook_breaker_cooldown')
+    def _check_webhook_breaker(self):
+        for record in self:
+            if record.webhook_breaker_threshold < 0:
+                raise ValidationError('Circuit breaker threshold cannot be negative')
+            if record.webhook_breaker_cooldown < 1:
+                raise ValidationError('Circuit breaker cooldown must be at least 1 second')
+    
+    @api.constrains('webhook_gzip_min_bytes', 'webhook_log_compress_min_bytes')
+    def _check_webhook_compression(self):
+        for record in self:
+            if record.webhook_gzip_min_bytes < 0 or record.webhook_log_compress_min_bytes < 0:
+                raise ValidationError('Compression thresholds cannot be negative')
+    
+    @api.constrains('webhook_log_keep_success_days', 'webhook_log_keep_error_days')
+    def _check_webhook_log_retention(self):
+        for record in self:
+            if record.webhook_log_keep_success_days < 0 or record.webhook_log_keep_error_days < 0:
+                raise ValidationError('Log retention cannot be negative')
+    
+    @api.constrains('webhook_rate_limit', 'webhook_rate_burst', 'webhook_max_in_flight')
+    def _check_webhook_rate_limit(self):
+        for record in self:
+            if record.webhook_rate_limit < 0 or record.webhook_max_in_flight < 0:
+                raise ValidationError('Rate limit and in-flight cap cannot be negative')
+            if record.webhook_rate_burst < 1:
+                raise ValidationError('Rate burst must be at least 1')
+    
+    @api.constrains('webhook_pool_connections', 'webhook_pool_maxsize')
+    def _check_webhook_pool(self):
+        for record in self:
+            if record.webhook_pool_connections < 1 or record.webhook_pool_maxsize < 1:
+                raise ValidationError('Connection pool sizes must be at least 1')
 
 
 class WarehouseContactMapping(models.Model):
@@ -0,0 +1,97 @@
+# models/sync_client_cursor.py
+from odoo import models, fields, api
+from odoo.tools import consteq
+from odoo.tools.misc import hmac as hmac_tool
+from datetime import datetime
+import base64
+
+SYNC_CURSOR_SCOPE = 'sync_app.sync_cursor'
+
+
+def encode_sync_cursor(env, scope, watermark):
+    """
+    Opaque cursor of a sync, handed to the client and sent back on its next
+    call. It carries the sync time and is signed, so clients cannot forge
+    one, and the server keeps no state for them.
+    """
+    message = f"{scope}:{watermark.isoformat()}"
+    encoded = base64.urlsafe_b64encode(message.encode()).decode().rstrip('=')
+    return f"{encoded}.{hmac_tool(env, SYNC_CURSOR_SCOPE, message)}"
+
+
+def decode_sync_cursor(env, scope, cursor):
+    """
+    Sync time carried by ``cursor``; an empty cursor asks for a full sync.
+
+    :raise ValueError: if the cursor is malformed, forged or of another scope
+    """
+    if not cursor:
+        return None
+    try:
+        encoded, signature = cursor.split('.')
+        message = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Malformed sync cursor')
+    if not consteq(signature, hmac_tool(env, SYNC_CURSOR_SCOPE, message)):
+        raise ValueError('Invalid sync cursor')
+    cursor_scope, _sep, watermark = message.partition(':')
+    if cursor_scope != scope:
+        raise ValueError(f'Sync cursor is not a {scope} cursor')
+    return datetime.fromisoformat(watermark)
+
+
+class SyncClientCursor(models.Model):
+    """
+    Last sync of each client that identifies itself with a ``client_id``
+    instead of keeping the cursor returned by the API.
+    """
+    _name = 'sync.client.cursor'
+    _description = 'Sync Client Cursor'
+    _order = 'user_id, client_id, scope'
+    _rec_name = 'client_id'
+
+    user_id = fields.Many2one(
+        'auth.user.token',
+        string='API User',
+        required=True,
+        ondelete='cascade'
+    )
+    client_id = fields.Char(string='Client', required=True)
+    scope = fields.Selection([
+        ('product', 'Products'),
+        ('loyalty', 'Loyalty'),
+    ], string='Scope', required=True)
+    last_sync = fields.Datetime(string='Last Sync')
+
+    _sql_constraints = [
+        ('client_scope_unique', 'unique(user_id, client_id, scope)', 'One cursor per client and scope'),
+    ]
+
+    @api.model
+    def _get_last_sync(self, user, client_id, scope):
+        cursor = self.search([
+            ('user_id', '=', user.id),
+            ('client_id', '=', client_id),
+            ('scope', '=', scope),
+        ], limit=1)
+        return cursor.last_sync or None
+
+    @api.model
+    def _set_last_sync(self, user, client_id, scope, last_sync):
+        self.env.cr.execute("""
+            INSERT INTO sync_client_cursor (user_id, client_id, scope, last_sync,
+                                            create_uid, create_date, write_uid, write_date)
+            VALUES (%(user_id)s, %(client_id)s, %(scope)s, %(last_sync)s,
+                    %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC')
+            ON CONFLICT (user_id, client_id, scope) DO UPDATE
+            SET last_sync = EXCLUDED.last_sync,
+                write_uid = EXCLUDED.write_uid,
+                write_date = EXCLUDED.write_date
+        """, {
+            'user_id': user.id,
+            'client_id': client_id,
+            'scope': scope,
+            'last_sync': last_sync,
+            'uid': self.env.uid,
+        })
+        self.invalidate_model()
@@ -0,0 +1,43 @@
+# models/webhook_breaker_state.py
+from odoo import models, fields, api
+
+
+class WebhookBreakerState(models.Model):
+    """
+    Last circuit breaker state reported for each webhook URL. Breakers live
+    in the memory of the processes delivering webhooks (HTTP workers, cron,
+    outbox or standalone dispatcher); each one writes here when its state or
+    failure count changes, so the configuration form shows what the senders
+    see rather than the breaker of the process rendering the page.
+    """
+    _name = 'webhook.breaker.state'
+    _description = 'Webhook Circuit Breaker State'
+    _rec_name = 'url'
+
+    url = fields.Char(string='URL', required=True, readonly=True)
+    state = fields.Selection([
+        ('closed', 'Closed'),
+        ('open', 'Open'),
+        ('half_open', 'Half Open'),
+    ], string='Circuit State', required=True, default='closed', readonly=True)
+    failures = fields.Integer(string='Consecutive Failures', readonly=True)
+
+    _sql_constraints = [
+        ('url_unique', 'unique(url)', 'One circuit breaker state per URL'),
+    ]
+
+    @api.model
+    def _store(self, url, state, failures):
+        """Upsert the state of ``url``"""
+        self.env.cr.execute("""
+            INSERT INTO webhook_breaker_state (url, state, failures, create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, %s, %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+            ON CONFLICT (url) DO UPDATE
+            SET state = EXCLUDED.state, failures = EXCLUDED.failures, write_date = EXCLUDED.write_date
+        """, (url, state, failures, self.env.uid, self.env.uid))
+
+    @api.model
+    def _get(self, url):
+        """Return (state, failures) last reported for ``url``"""
+        record = self.search([('url', '=', url)], limit=1)
+        return (record.state, record.failures) if record else ('closed', 0)
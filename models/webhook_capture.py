@@ -0,0 +1,255 @@
+# models/webhook_capture.py
+from odoo import models, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+CAPTURE_KEY = 'sync_app.webhook_changes'
+
+
+def _captured_payloads(env, config, changes):
+    """Events of the captured ``changes`` somebody subscribed to"""
+    from .cus_models import _webhook_targets
+
+    payloads = []
+    for model_name, operations in changes.items():
+        for operation in (0, 1, 2):
+            # Data is only read for events somebody subscribed to
+            if operations[operation] and _webhook_targets(config, model_name, operation):
+                payloads += env[model_name]._webhook_change_payloads(operation, sorted(operations[operation]))
+    return payloads
+
+
+def _store_captured_changes(cr, changes):
+    """
+    Pre-commit callback: in outbox and standalone modes, insert the logs of
+    the captured changes in the transaction that made them, so they are
+    committed, or rolled back, together. Nothing is left for the post-commit
+    callback then.
+    """
+    from odoo import api, SUPERUSER_ID
+    from .cus_models import DEFERRED_DELIVERY_MODES, _get_webhook_config, _insert_webhook_logs
+
+    config = _get_webhook_config()
+    if not config or config['delivery_mode'] not in DEFERRED_DELIVERY_MODES:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    _insert_webhook_logs(env, _captured_payloads(env, config, changes), config)
+    env.flush_all()
+    changes.clear()
+
+
+def _send_captured_changes(db_name, changes):
+    """
+    Post-commit callback: build the events of the committed changes on a
+    new cursor, queue them in one go and hand them to the dispatchers.
+    """
+    from odoo import api, SUPERUSER_ID
+    from odoo.modules.registry import Registry
+    from .cus_models import _get_webhook_config, send_webhooks
+
+    config = _get_webhook_config()
+    if not config or not changes:
+        return
+    try:
+        registry = Registry(db_name)
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            send_webhooks(env, _captured_payloads(env, config, changes))
+    except Exception as e:
+        _logger.error(f"Failed to send captured changes: {e}", exc_info=True)
+
+
+class WebhookChangeCapture(models.AbstractModel):
+    """
+    Collects the ids created, updated and deleted during a transaction and
+    sends one event per record after commit, queued in one go. In outbox
+    and standalone modes the logs are inserted just before the commit, in
+    the same transaction. Nothing is sent for rolled back work, and
+    repeated writes of a record in one transaction are announced once.
+    """
+    _name = 'webhook.change.capture'
+    _description = 'Webhook Change Capture'
+
+    # Event type sent to the receiver
+    _webhook_type = None
+    # Fields whose change triggers an update event (None = any field)
+    _webhook_fields = None
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._webhook_capture(0)
+        return records
+
+    def write(self, vals):
+        if self._webhook_fields is not None and not self._webhook_fields.intersection(vals):
+            return super().write(vals)
+        # Records leaving the filter are announced too, so the receiver can drop them
+        before = self._webhook_filter()
+        result = super().write(vals)
+        self._webhook_capture(1, before | self._webhook_filter())
+        return result
+
+    def unlink(self):
+        self._webhook_capture(2)
+        return super().unlink()
+
+    def _webhook_skip(self):
+        """Whether changes made in the current context must not be sent"""
+        return False
+
+    def _webhook_filter(self):
+        """Records whose changes are sent"""
+        return self
+
+    def _webhook_capture(self, operation, records=None):
+        """Remember the records (default: the filtered ones) for the commit callbacks"""
+        if self._webhook_skip():
+            return
+        if records is None:
+            records = self._webhook_filter()
+        if not records:
+            return
+
+        cr = self.env.cr
+        data = cr.postcommit.data
+        changes = data.get(CAPTURE_KEY)
+        if changes is None:
+            changes = data[CAPTURE_KEY] = {}
+            db_name = cr.dbname
+            cr.precommit.add(lambda: _store_captured_changes(cr, changes))
+            cr.postcommit.add(lambda: _send_captured_changes(db_name, changes))
+
+        operations = changes.setdefault(self._name, {0: set(), 1: set(), 2: set()})
+        ids = set(records.ids)
+        if operation == 0:
+            operations[0] |= ids
+        elif operation == 1:
+            operations[1] |= ids - operations[0]
+        else:
+            # Records created in the same transaction were never announced
+            operations[2] |= ids - operations[0]
+            operations[0] -= ids
+            operations[1] -= ids
+
+    def _webhook_data(self):
+        """Data sent with create and update events, per record id"""
+        return {}
+
+    @api.model
+    def _webhook_change_payloads(self, operation, ids):
+        """
+        Build the event of each changed record. Records get an event of
+        their own so each one keeps its ordering key, while the events of a
+        transaction are still queued and delivered together.
+        """
+        if operation == 2:
+            return [
+                {'operation': 2, 'type': self._webhook_type, 'model': self._name, 'ids': [record_id]}
+                for record_id in ids
+            ]
+        records = self.browse(ids).exists()
+        data = records._webhook_data()
+        payloads = []
+        for record in records:
+            payload = {'operation': operation, 'type': self._webhook_type, 'model': self._name, 'ids': record.ids}
+            if record.id in data:
+                payload['data'] = data[record.id]
+            payloads.append(payload)
+        return payloads
+
+
+class ProductTemplate(models.Model):
+    _name = 'product.template'
+    _inherit = ['product.template', 'webhook.change.capture']
+
+    _webhook_type = 0
+    # Fields sent by _webhook_data; other writes have nothing to announce
+    _webhook_fields = {
+        'name', 'list_price', 'barcode', 'uom_id',
+        'volume', 'weight', 'active', 'available_in_pos',
+    }
+
+    def _webhook_skip(self):
+        # Products created or updated by a loyalty program are not sent
+        context_model = self._context.get('params', {}).get('model')
+        return bool(
+            self._context.get('from_loyalty_program')
+            or self._context.get('loyalty_program_id')
+            or context_model == 'loyalty.program'
+        )
+
+    def _webhook_filter(self):
+        return self.filtered(lambda template: template.available_in_pos and template.barcode)
+
+    def _webhook_data(self):
+        # Same shape as the products returned by /api/sync/product
+        data = {}
+        for template in self:
+            uom = template.uom_id
+            data[template.id] = {
+                'id': template.id,
+                'name': template.name,
+                'uom_id': {
+                    'id': uom.id,
+                    'name': uom.name,
+                    'uom_type': uom.uom_type,
+                    'rounding': uom.rounding,
+                    'factor': uom.factor,
+                } if uom else None,
+                'barcode': template.barcode,
+                'list_price': template.list_price,
+                'display_name': template.name,
+                'volume': template.volume,
+                'weight': template.weight,
+                'active': template.active,
+                'available_in_pos': template.available_in_pos,
+                'product_id': template.product_variant_ids[:1].id or None,
+            }
+        return data
+
+
+class ProductProduct(models.Model):
+    _name = 'product.product'
+    _inherit = ['product.product', 'webhook.change.capture']
+
+    _webhook_type = 1
+    _webhook_fields = {'list_price', 'lst_price', 'barcode', 'active'}
+
+    def _webhook_data(self):
+        return {
+            product.id: {
+                'id': product.id,
+                'name': product.name,
+                'display_name': product.display_name,
+                'barcode': product.barcode,
+                'list_price': product.list_price,
+                'lst_price': product.lst_price,
+                'product_tmpl_id': product.product_tmpl_id.id,
+                'available_in_pos': product.available_in_pos,
+                'active': product.active,
+            }
+            for product in self
+        }
+
+
+class LoyaltyProgram(models.Model):
+    _name = 'loyalty.program'
+    _inherit = ['loyalty.program', 'webhook.change.capture']
+
+    _webhook_type = 2
+
+
+class LoyaltyRule(models.Model):
+    _name = 'loyalty.rule'
+    _inherit = ['loyalty.rule', 'webhook.change.capture']
+
+    _webhook_type = 3
+
+
+class LoyaltyReward(models.Model):
+    _name = 'loyalty.reward'
+    _inherit = ['loyalty.reward', 'webhook.change.capture']
+
+    _webhook_type = 4
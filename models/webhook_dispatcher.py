@@ -0,0 +1,653 @@
+# models/webhook_dispatcher.py
+import collections
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+
+# Jobs taken from each lane per scheduling round
+LANE_WEIGHTS = {PRIORITY_HIGH: 6, PRIORITY_NORMAL: 3, PRIORITY_LOW: 1}
+
+
+class LaneQueue:
+    """
+    Bounded queue with one lane per priority and weighted round-robin reads.
+
+    Out of every round of ``sum(weights)`` reads, each lane gets up to its
+    weight when it has jobs waiting, so high priority jobs go first without
+    starving the other lanes. ``maxsize`` is split between the lanes in
+    proportion to their weight, so the queue as a whole never holds more
+    than ``maxsize`` jobs and a flood of low priority jobs never keeps high
+    priority ones out.
+    """
+
+    def __init__(self, maxsize=0, weights=None):
+        weights = weights or LANE_WEIGHTS
+        self._weights = weights
+        self._lanes = {priority: collections.deque() for priority in weights}
+        self.maxsize = maxsize
+        self._schedule = [
+            priority
+            for priority in sorted(weights, reverse=True)
+            for _turn in range(weights[priority])
+        ]
+        self._position = 0
+        self._condition = threading.Condition()
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        total_weight = sum(self._weights.values())
+        self._maxsize = maxsize
+        self._limits = {
+            priority: max(1, maxsize * weight // total_weight) if maxsize else 0
+            for priority, weight in self._weights.items()
+        }
+
+    def lane_size(self, priority):
+        """Number of jobs the lane of ``priority`` may hold (0 = unbounded)"""
+        return self._limits.get(priority, self._limits[PRIORITY_NORMAL])
+
+    def qsize(self):
+        with self._condition:
+            return sum(len(lane) for lane in self._lanes.values())
+
+    def put(self, job, priority=PRIORITY_NORMAL, timeout=None):
+        """Add a job to its lane, waiting up to ``timeout`` for room"""
+        if priority not in self._lanes:
+            priority = PRIORITY_NORMAL
+        lane = self._lanes[priority]
+        with self._condition:
+            if not self._condition.wait_for(lambda: not self._limits[priority] or len(lane) < self._limits[priority], timeout):
+                raise queue.Full
+            lane.append(job)
+            self._condition.notify_all()
+
+    def get(self, timeout=None):
+        """Take the next job according to the lane weights"""
+        with self._condition:
+            if not self._condition.wait_for(self._has_jobs, timeout):
+                raise queue.Empty
+            job = self._pop()
+            self._condition.notify_all()
+            return job
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+    def _has_jobs(self):
+        return any(self._lanes.values())
+
+    def _pop(self):
+        for _index in range(len(self._schedule)):
+            priority = self._schedule[self._position]
+            self._position = (self._position + 1) % len(self._schedule)
+            if self._lanes[priority]:
+                return self._lanes[priority].popleft()
+        raise queue.Empty
+
+
+class WebhookDispatcher:
+    """
+    Per-process pool of webhook delivery threads fed by bounded queues.
+
+    Each worker thread owns one queue (shard). Jobs submitted with a key,
+    e.g. the model and record ids of an event, always land in the same
+    shard, so events for one record are delivered in order while different
+    records are delivered in parallel, up to ``worker_count`` at a time.
+
+    The number of threads and the number of queued jobs are capped, so a
+    burst of events never grows the process beyond those limits. When a
+    shard is full, ``submit`` waits briefly (backpressure) and then reports
+    the overflow to the caller, which leaves the job in the database for the
+    scheduler to pick up later.
+
+    With a ``batch_handler`` and ``batch_size`` above 1, each worker gathers
+    the jobs arriving within ``batch_window`` seconds and hands them over
+    together.
+
+    Each shard is a ``LaneQueue``: jobs are submitted with a priority and
+    high priority jobs of a shard are picked before the bulk ones waiting in
+    the same shard.
+    """
+
+    def __init__(self, handler, worker_count=4, queue_size=1000,
+                 batch_handler=None, batch_size=1, batch_window=0):
+        self.handler = handler
+        self.batch_handler = batch_handler
+        self.worker_count = max(1, worker_count)
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.queues = [LaneQueue() for _index in range(self.worker_count)]
+        self.retired = False
+        self.pid = os.getpid()
+        self._round_robin = itertools.count()
+        self._threads = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self.configure(queue_size, batch_size, batch_window)
+
+    def configure(self, queue_size, batch_size=1, batch_window=0):
+        """Apply new queue and batch limits"""
+        with self._lock:
+            shard_size = max(1, -(-queue_size // self.worker_count))
+            for shard in self.queues:
+                shard.maxsize = shard_size
+            self.batch_size = max(1, batch_size)
+            self.batch_window = batch_window
+
+    def retire(self):
+        """Stop the workers once they have emptied their queues"""
+        self.retired = True
+
+    def drain(self, timeout=30):
+        """
+        Stop accepting jobs and wait up to ``timeout`` seconds for the
+        queued and in-flight ones to be handled.
+
+        :return: the jobs that were not finished: still being sent when the
+                 timeout expired, or never started
+        """
+        self.retire()
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            threads = list(self._threads.values())
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        with self._lock:
+            leftover = [job for jobs in self._active.values() for job in jobs]
+        for shard in self.queues:
+            while True:
+                try:
+                    leftover.append(shard.get_nowait())
+                except queue.Empty:
+                    break
+        return leftover
+
+    def submit(self, job, key=None, timeout=0.5, priority=PRIORITY_NORMAL):
+        """
+        Queue a job for delivery.
+
+        :param job: tuple of positional arguments for the handler
+        :param key: ordering key; jobs sharing a key and priority run one
+                    after another
+        :param timeout: seconds to wait for a free slot when the queue is full
+        :param priority: lane of the job, one of the ``PRIORITY_*`` values
+        :return: True if queued, False if the queue stayed full or the
+                 dispatcher is shutting down
+        """
+        if self.retired:
+            return False
+        if key is None:
+            index = next(self._round_robin) % self.worker_count
+        else:
+            index = hash(key) % self.worker_count
+        shard = self.queues[index]
+        self._ensure_workers()
+        try:
+            shard.put(job, priority, timeout=timeout)
+        except queue.Full:
+            _logger.warning(f"Webhook queue {index} lane {priority} full ({shard.lane_size(priority)} jobs), deferring to database")
+            return False
+        return True
+
+    def _ensure_workers(self):
+        with self._lock:
+            for index in range(self.worker_count):
+                thread = self._threads.get(index)
+                if thread and thread.is_alive():
+                    continue
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(index,),
+                    name=f'webhook-dispatcher-{index}',
+                    daemon=True,
+                )
+                self._threads[index] = thread
+                thread.start()
+
+    def _run(self, index):
+        shard = self.queues[index]
+        while True:
+            jobs = self._next_jobs(shard)
+            if not jobs:
+                if self.retired:
+                    break
+                continue
+            with self._lock:
+                self._active[index] = jobs
+            try:
+                if self.batch_handler and self.batch_size > 1:
+                    self.batch_handler(jobs)
+                else:
+                    for job in jobs:
+                        self.handler(*job)
+            except Exception:
+                _logger.exception("Webhook dispatcher job failed")
+            finally:
+                with self._lock:
+                    self._active.pop(index, None)
+        with self._lock:
+            if self._threads.get(index) is threading.current_thread():
+                del self._threads[index]
+
+    def _next_jobs(self, shard):
+        """
+        Wait up to a second for a job, then keep collecting until
+        ``batch_size`` jobs are gathered or ``batch_window`` seconds have
+        passed since the first one.
+        """
+        try:
+            jobs = [shard.get(timeout=1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_window
+        while len(jobs) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(shard.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return jobs
+
+
+_dispatchers = {}
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher(handler, worker_count=4, queue_size=1000,
+                   batch_handler=None, batch_size=1, batch_window=0, name=None):
+    """
+    Return the dispatcher ``name`` of the current process, creating it on
+    first use. Each webhook subscriber has its own dispatcher, so a slow
+    receiver only fills its own queues.
+
+    Changing the worker count replaces the dispatcher; the previous one
+    finishes its queued jobs and then stops.
+    """
+    with _dispatcher_lock:
+        dispatcher = _dispatchers.get(name)
+        # A forked worker must not reuse the threads of its parent
+        if dispatcher is not None and dispatcher.pid == os.getpid() \
+                and dispatcher.worker_count != max(1, worker_count):
+            dispatcher.retire()
+            dispatcher = None
+        if dispatcher is None or dispatcher.pid != os.getpid():
+            dispatcher = _dispatchers[name] = WebhookDispatcher(
+                handler, worker_count, queue_size,
+                batch_handler=batch_handler,
+                batch_size=batch_size,
+                batch_window=batch_window,
+            )
+        else:
+            dispatcher.configure(queue_size, batch_size, batch_window)
+        return dispatcher
+
+
+def current_dispatchers():
+    """Return the dispatchers started by the current process"""
+    with _dispatcher_lock:
+        return [dispatcher for dispatcher in _dispatchers.values() if dispatcher.pid == os.getpid()]
+
+
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+
+
+def get_http_session(url, pool_connections=4, pool_maxsize=10):
+    """
+    Return the shared pooled session for the destination of ``url``.
+
+    One session is kept per scheme, host and pool size, so deliveries to the
+    same receiver reuse keep-alive connections instead of doing a new TCP and
+    TLS handshake each time. Timeout and SSL verification stay per request.
+    """
+    global _sessions_pid
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc, pool_connections, pool_maxsize)
+    with _sessions_lock:
+        # Sockets must not be shared with a parent process after fork
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        session = _sessions.get(key)
+        if session is None:
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[key] = session
+        return session
+
+
+class WebhookLogWriter:
+    """
+    Buffer of webhook.log state transitions flushed in batches.
+
+    Values recorded for the same log are merged, so intermediate states
+    collapse into the last one. A background thread hands the buffer to
+    ``flush_handler`` every ``interval`` seconds, or sooner once
+    ``max_pending`` logs are waiting, which turns many small transactions
+    into one cursor per flush.
+    """
+
+    def __init__(self, flush_handler, interval=2.0, max_pending=500):
+        self.flush_handler = flush_handler
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pid = os.getpid()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def record(self, log_id, values):
+        """Merge values into the pending update of a log"""
+        with self._lock:
+            self._pending.setdefault(log_id, {}).update(values)
+            size = len(self._pending)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='webhook-log-writer', daemon=True)
+                self._thread.start()
+        if size >= self.max_pending:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Write everything buffered so far. When the handler fails, the
+        updates are put back under the ones recorded since and retried on
+        the next flush.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            try:
+                self.flush_handler(pending)
+            except Exception:
+                _logger.exception(f"Failed to flush {len(pending)} webhook log updates, retrying later")
+                with self._lock:
+                    for log_id, values in pending.items():
+                        self._pending[log_id] = dict(values, **self._pending.get(log_id, {}))
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+
+def get_log_writer(flush_handler, interval=2.0):
+    """Return the log writer of the current process, creating it on first use"""
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None or _log_writer.pid != os.getpid():
+            _log_writer = WebhookLogWriter(flush_handler, interval)
+        else:
+            _log_writer.interval = interval
+        return _log_writer
+
+
+def current_log_writer():
+    """Return the log writer of the current process, if it was started"""
+    with _log_writer_lock:
+        if _log_writer is not None and _log_writer.pid == os.getpid():
+            return _log_writer
+        return None
+
+
+class CircuitBreaker:
+    """
+    Per-destination circuit breaker.
+
+    After ``threshold`` consecutive failures the circuit opens and ``allow``
+    refuses every attempt for ``cooldown`` seconds. The first caller after
+    the cooldown gets a single probe (half open); its success closes the
+    circuit and its failure opens it again. A probe that ends without an
+    outcome, e.g. on an unexpected error, counts as a failure through
+    ``end_probe``.
+
+    ``on_change`` is called with the new state and failure count whenever
+    either changes, outside of the breaker lock.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=5, cooldown=60, on_change=None):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.on_change = on_change
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.held_until = 0.0
+        self._probe_thread = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a request may be sent now"""
+        if not self.threshold:
+            return True
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state != self.OPEN or time.time() < self._retry_at():
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_thread = threading.get_ident()
+            change = (self.state, self.failures)
+        self._notify(change)
+        return True
+
+    def record_success(self):
+        with self._lock:
+            before = (self.state, self.failures)
+            self.state = self.CLOSED
+            self.failures = 0
+            change = (self.state, self.failures)
+        if change != before:
+            self._notify(change)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.threshold and self.failures >= self.threshold):
+                if self.state != self.OPEN:
+                    _logger.warning(f"Webhook circuit opened after {self.failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.time()
+            change = (self.state, self.failures)
+        self._notify(change)
+
+    def record_throttled(self, until):
+        """
+        The receiver asked to wait until the epoch time ``until``. A probe
+        answered that way opens the circuit again, at least until then.
+        """
+        with self._lock:
+            if self.state != self.HALF_OPEN:
+                return
+            self.state = self.OPEN
+            self.opened_at = time.time()
+            self.held_until = until
+            change = (self.state, self.failures)
+        self._notify(change)
+
+    def _notify(self, change):
+        if self.on_change is not None:
+            try:
+                self.on_change(*change)
+            except Exception:
+                _logger.exception("Failed to report the circuit breaker state")
+
+    def end_probe(self):
+        """Count the probe of the current thread as failed if it recorded no outcome"""
+        with self._lock:
+            if self.state != self.HALF_OPEN or self._probe_thread != threading.get_ident():
+                return
+        _logger.warning("Webhook circuit probe ended without an outcome")
+        self.record_failure()
+
+    def retry_at(self):
+        """Epoch time at which a parked event should be tried again"""
+        with self._lock:
+            return self._retry_at()
+
+    def _retry_at(self):
+        return max(self.opened_at + self.cooldown, self.held_until)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url, threshold=5, cooldown=60, on_change=None):
+    """Return the circuit breaker of ``url`` in the current process"""
+    with _breakers_lock:
+        breaker = _breakers.get(url)
+        if breaker is None:
+            breaker = _breakers[url] = CircuitBreaker(threshold, cooldown)
+        breaker.threshold = threshold
+        breaker.cooldown = cooldown
+        if on_change is not None:
+            breaker.on_change = on_change
+        return breaker
+
+
+class RateLimiter:
+    """
+    Per-destination token bucket and in-flight cap.
+
+    ``acquire`` lets on average ``rate`` requests per second through, with
+    bursts of up to ``burst``, and no more than ``max_in_flight`` at once;
+    0 disables either limit. Callers wait for their turn instead of bursting
+    into the receiver's own limit. ``pause_until`` holds every request back,
+    e.g. until the time given by a ``Retry-After`` header.
+    """
+
+    def __init__(self, rate=0, burst=1, max_in_flight=0):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_in_flight = max_in_flight
+        self.tokens = float(self.burst)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    def configure(self, rate, burst, max_in_flight):
+        with self._condition:
+            self.rate = rate
+            self.burst = max(1, burst)
+            self.max_in_flight = max_in_flight
+            self.tokens = min(self.tokens, self.burst)
+            self._condition.notify_all()
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a token and an in-flight slot.
+
+        :return: True when the request may be sent, False after ``timeout``
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                wait = self._wait_time()
+                if wait <= 0:
+                    if self.rate:
+                        self.tokens -= 1
+                    self.in_flight += 1
+                    return True
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                self._condition.wait(wait)
+
+    def try_acquire(self):
+        """
+        Take a token and an in-flight slot without waiting.
+
+        :return: 0 when the request may proceed, otherwise the seconds to
+                 wait before trying again
+        """
+        with self._condition:
+            wait = self._wait_time()
+            if wait <= 0:
+                if self.rate:
+                    self.tokens -= 1
+                self.in_flight += 1
+                return 0
+            return wait
+
+    def release(self):
+        """Free the in-flight slot of a finished request"""
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._condition.notify_all()
+
+    def is_idle(self):
+        """Whether the bucket has refilled completely and nothing is in flight"""
+        with self._condition:
+            tokens = self.tokens + (time.monotonic() - self._updated) * self.rate if self.rate else self.burst
+            return tokens >= self.burst and not self.in_flight and self.paused_until <= time.time()
+
+    def pause_until(self, until):
+        """Hold requests back until the epoch time ``until``"""
+        with self._condition:
+            self.paused_until = max(self.paused_until, until)
+
+    def _wait_time(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        paused = self.paused_until - time.time()
+        if paused > 0:
+            return paused
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            # Woken up by release()
+            return 1.0
+        if self.rate and self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        return 0
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(url, rate=0, burst=1, max_in_flight=0):
+    """Return the rate limiter of ``url``, or of any other key, in the current process"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(url)
+        if limiter is None:
+            limiter = _rate_limiters[url] = RateLimiter(rate, burst, max_in_flight)
+        elif (limiter.rate, limiter.burst, limiter.max_in_flight) != (rate, max(1, burst), max_in_flight):
+            limiter.configure(rate, burst, max_in_flight)
+        return limiter
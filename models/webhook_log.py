@@ -1,10 +1,55 @@
 # models/webhook_log.py
 from odoo import models, fields, api
+from odoo.tools.sql import create_index
+from datetime import timedelta
+import base64
+import gzip
+import json
+import logging
+import time
+import zlib
+
+_logger = logging.getLogger(__name__)
+
+# Webhooks handed to the dispatcher per scheduler run, i.e. per minute
+DISPATCH_LIMIT = 500
+
+
+def is_full_update(payload):
+    """
+    Whether an event is an update carrying the whole record; a delta only
+    carries its own changes and cannot stand in for older updates.
+    """
+    return payload.get('operation') == 1 and not payload.get('delta')
+
+
+def encode_log_payload(payload, compress_min_bytes=0):
+    """
+    Serialize a payload for storage in webhook.log.
+    
+    The JSON is written without indentation. When ``compress_min_bytes`` is
+    set and the JSON reaches that size, it is zlib-compressed and stored
+    base64 encoded.
+    
+    :return: tuple (stored text, encoding)
+    """
+    text = json.dumps(payload, separators=(',', ':'), default=str)
+    if compress_min_bytes and len(text) >= compress_min_bytes:
+        return base64.b64encode(zlib.compress(text.encode())).decode(), 'zlib'
+    return text, 'json'
+
+
+def decode_log_payload(stored, encoding='json'):
+    """Return the JSON text of a stored payload"""
+    if stored and encoding == 'zlib':
+        return zlib.decompress(base64.b64decode(stored)).decode()
+    return stored or ''
+
 
 class WebhookLog(models.Model):
     _name = 'webhook.log'
     _description = 'Webhook Execution Log'
-    _order = 'create_date desc'
+    _order = 'id desc'
     
     name = fields.Char(string='Reference', compute='_compute_name', store=True)
     url = fields.Char(string='Webhook URL', required=True)
@@ -15,18 +60,36 @@ class WebhookLog(models.Model):
         ('delete', 'Delete')
     ], string='Operation', required=True)
     record_ids = fields.Char(string='Record IDs')
+    record_key = fields.Char(string='Record Key', index=True,
+                             help='Subscriber, model and record ids; events sharing a key are delivered in order')
+    subscriber_id = fields.Many2one('webhook.subscriber', string='Subscriber', index=True, ondelete='set null',
+                                    help='Empty for the webhook URL of the configuration, or once the subscriber is deleted')
+    priority = fields.Selection([
+        ('0', 'Low'),
+        ('1', 'Normal'),
+        ('2', 'High'),
+    ], string='Priority', default='1', required=True,
+        help='High: order and stock events. Low: catalog and checkpoint events. '
+             'Higher priorities are claimed and sent first')
     
     # Request details
-    payload = fields.Text(string='Request Payload')
+    payload = fields.Text(string='Stored Payload')
+    payload_encoding = fields.Selection([
+        ('json', 'JSON'),
+        ('zlib', 'zlib Compressed'),
+    ], string='Payload Encoding', default='json', required=True)
+    payload_display = fields.Text(string='Request Payload', compute='_compute_payload_display')
     headers = fields.Text(string='Request Headers')
     
     # Response details
     status = fields.Selection([
         ('pending', 'Pending'),
+        ('queued', 'Queued'),
         ('sending', 'Sending'),
         ('success', 'Success'),
         ('error', 'Error'),
-        ('retrying', 'Retrying')
+        ('retrying', 'Retrying'),
+        ('superseded', 'Superseded')
     ], string='Status', default='pending', required=True)
     
     status_code = fields.Integer(string='HTTP Status Code')
@@ -45,9 +108,404 @@ class WebhookLog(models.Model):
     # Duration
     duration_ms = fields.Integer(string='Duration (ms)', help='Time taken to receive response')
     
+    def init(self):
+        create_index(self._cr, 'webhook_log_status_next_retry_idx', self._table, ['status', 'next_retry_at'])
+        create_index(self._cr, 'webhook_log_create_date_idx', self._table, ['create_date'])
+        create_index(self._cr, 'webhook_log_sent_at_idx', self._table, ['sent_at'])
+        create_index(self._cr, 'webhook_log_status_priority_idx', self._table, ['status', 'priority DESC', 'id'])
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        logs = super().create(vals_list)
+        logs.filtered(
+            lambda log: log.operation == 'update' and log.record_key and is_full_update(log._get_payload())
+        )._supersede_older_updates()
+        return logs
+    
+    def _supersede_older_updates(self):
+        """
+        Collapse unsent updates: older ``update`` logs of the same record
+        that are still waiting in the database are marked ``superseded``, so
+        only the newest payload is delivered. Rows currently claimed by a
+        sender are locked and left alone.
+        """
+        for log in self:
+            self.env.cr.execute("""
+                UPDATE webhook_log
+                SET status = 'superseded',
+                    next_retry_at = NULL,
+                    completed_at = (now() at time zone 'UTC')
+                WHERE id IN (
+                    SELECT id
+                    FROM webhook_log
+                    WHERE record_key = %s
+                    AND operation = 'update'
+                    AND status IN ('pending', 'retrying')
+                    AND id < %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            """, (log.record_key, log.id))
+            if self.env.cr.rowcount:
+                _logger.info(f"Superseded {self.env.cr.rowcount} queued updates of {log.record_key}")
+        self.invalidate_model(['status', 'next_retry_at', 'completed_at'])
+    
+    def _park_behind_older(self):
+        """
+        Put back to ``pending`` the logs that have an older unfinished log of
+        the same record. The scheduler claims the events of a record in
+        order, whereas the in-memory queue would send them right away, e.g.
+        an update before the failed create it depends on.
+        
+        :return: the parked logs
+        """
+        keyed = self.filtered('record_key')
+        if not keyed:
+            return self.browse()
+        self.env.cr.execute("""
+            UPDATE webhook_log l
+            SET status = 'pending'
+            WHERE l.id IN %s
+            AND EXISTS (
+                SELECT 1
+                FROM webhook_log o
+                WHERE o.record_key = l.record_key
+                AND o.id < l.id
+                AND o.status IN ('pending', 'queued', 'sending', 'retrying')
+            )
+            RETURNING l.id
+        """, (tuple(keyed.ids),))
+        parked = self.browse([row[0] for row in self.env.cr.fetchall()])
+        parked.invalidate_recordset(['status'])
+        return parked
+    
+    def _outdated_updates(self):
+        """
+        Updates among these logs whose record has a newer log that was
+        delivered: sending them again would overwrite newer data.
+        """
+        updates = self.filtered(lambda log: log.operation == 'update' and log.record_key)
+        if not updates:
+            return self.browse()
+        self.env.cr.execute("""
+            SELECT l.id
+            FROM webhook_log l
+            WHERE l.id IN %s
+            AND EXISTS (
+                SELECT 1
+                FROM webhook_log o
+                WHERE o.record_key = l.record_key
+                AND o.id > l.id
+                AND o.status = 'success'
+            )
+        """, (tuple(updates.ids),))
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+    
     @api.depends('model', 'operation', 'record_ids')
     def _compute_name(self):
         operation_names = {'create': 'Create', 'update': 'Update', 'delete': 'Delete'}
         for record in self:
             operation_name = operation_names.get(record.operation, 'Unknown')
-            record.name = f"{record.model} - {operation_name} ({record.record_ids})"
\ No newline at end of file
+            record.name = f"{record.model} - {operation_name} ({record.record_ids})"
+    
+    @api.depends('payload', 'payload_encoding')
+    def _compute_payload_display(self):
+        for record in self:
+            try:
+                text = decode_log_payload(record.payload, record.payload_encoding)
+                record.payload_display = json.dumps(json.loads(text), indent=2) if text else False
+            except (ValueError, zlib.error):
+                record.payload_display = record.payload
+    
+    def _get_payload(self):
+        """Return the stored payload as a dict"""
+        self.ensure_one()
+        return json.loads(decode_log_payload(self.payload, self.payload_encoding) or '{}')
+    
+    def _get_target(self, config):
+        """
+        Configuration of the subscriber of this log, or None when the
+        subscriber is no longer active, in which case the log is failed.
+        """
+        from .cus_models import _webhook_target
+        
+        self.ensure_one()
+        if not self.subscriber_id and '/' in (self.record_key or ''):
+            # Only subscriber logs carry a "<subscriber id>/" key prefix: this
+            # subscriber was deleted and its events must not go to the default URL
+            target = None
+        else:
+            target = _webhook_target(config, self.subscriber_id.id)
+        if target is None:
+            self.write({
+                'status': 'error',
+                'error_message': 'Webhook subscriber removed or inactive',
+                'completed_at': fields.Datetime.now(),
+            })
+        return target
+    
+    @api.model
+    def _cron_dispatch_pending(self, limit=DISPATCH_LIMIT):
+        """
+        Hand webhooks that overflowed the in-memory queue, and retries that
+        are due, back to the dispatcher of this process.
+        """
+        from .cus_models import _get_webhook_config
+        
+        config = _get_webhook_config()
+        if not config:
+            return
+        
+        if config['delivery_mode'] == 'outbox':
+            return self._process_outbox(config)
+        if config['delivery_mode'] == 'standalone':
+            # Delivered by the webhook_dispatcher process
+            return
+        
+        self._dispatch_due(config, limit)
+    
+    @api.model
+    def _dispatch_due(self, config, limit):
+        """
+        Claim due webhooks and queue them on the dispatcher of this process.
+        
+        :return: number of webhooks handed to the dispatcher
+        """
+        from .cus_models import _submit_webhook_logs
+        
+        logs = self._claim_due(limit)
+        if not logs:
+            return 0
+        
+        # Commit the queued state first so workers never race this transaction
+        logs.write({'status': 'queued'})
+        self.env.cr.commit()
+        
+        jobs = []
+        for log in logs:
+            target = log._get_target(config)
+            if target is None:
+                continue
+            try:
+                payload = log._get_payload()
+            except (ValueError, zlib.error):
+                log.write({'status': 'error', 'error_message': 'Invalid stored payload'})
+                continue
+            jobs.append((log, payload, target, log.retry_count))
+        
+        overflow = self.browse(_submit_webhook_logs(jobs))
+        dispatched = len(jobs) - len(overflow)
+        overflow.write({'status': 'pending'})
+        self.env.cr.commit()
+        _logger.info(f"Dispatched {dispatched} pending webhooks")
+        return dispatched
+
+    
+    @api.model
+    def _claim_due(self, limit):
+        """
+        Lock a batch of due webhooks for this transaction.
+        
+        Rows locked by another transaction are skipped, so several workers
+        can drain the queue in parallel without sending a row twice. A row is
+        only due once every older row of the same record is finished, which
+        keeps the events of one record in order while different records
+        proceed in parallel. Higher priority rows are claimed first.
+        """
+        self.env.cr.execute("""
+            SELECT l.id
+            FROM webhook_log l
+            WHERE l.status IN ('pending', 'retrying')
+            AND (l.next_retry_at IS NULL OR l.next_retry_at <= (now() at time zone 'UTC'))
+            AND NOT EXISTS (
+                SELECT 1
+                FROM webhook_log o
+                WHERE o.record_key = l.record_key
+                AND o.id < l.id
+                AND o.status IN ('pending', 'queued', 'sending', 'retrying')
+            )
+            ORDER BY l.priority DESC, l.id
+            LIMIT %s
+            FOR UPDATE OF l SKIP LOCKED
+        """, (limit,))
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+    
+    @api.model
+    def _process_outbox(self, config, max_batches=10):
+        """
+        Deliver due outbox rows in batches, committing after each batch.
+        
+        :param config: webhook configuration dict
+        :param max_batches: stop after this many batches so one run stays short
+        :return: number of rows processed
+        """
+        from .cus_models import _attempt_webhook, _attempt_webhook_batch, _chunk_webhook_batch
+        
+        processed = 0
+        for _batch in range(max_batches):
+            logs = self._claim_due(config['outbox_batch_size'])
+            if not logs:
+                break
+            
+            # Entries per subscriber, since each has its own URL
+            targets = {}
+            for log in logs:
+                target = log._get_target(config)
+                if target is None:
+                    continue
+                try:
+                    entry = (log.id, log._get_payload(), log.retry_count)
+                except (ValueError, zlib.error):
+                    log.write({'status': 'error', 'error_message': 'Invalid stored payload'})
+                    continue
+                targets.setdefault(target['subscriber_id'], (target, []))[1].append(entry)
+            
+            for target, entries in targets.values():
+                if config['batch_enabled']:
+                    for chunk in _chunk_webhook_batch(entries, config['batch_size'], config['batch_max_bytes']):
+                        for log_id, values in _attempt_webhook_batch(chunk, target).items():
+                            self.browse(log_id).write(values)
+                else:
+                    for log_id, payload, retry_count in entries:
+                        self.browse(log_id).write(_attempt_webhook(payload, target, retry_count))
+            
+            processed += len(logs)
+            self.env.cr.commit()
+        
+        if processed:
+            _logger.info(f"Processed {processed} outbox webhooks")
+        return processed
+    
+    @api.model
+    def _cron_sweep_stale(self):
+        """
+        Put webhooks stranded in ``queued`` or ``sending`` back to ``pending``.
+        
+        A row stays in these states only while a dispatcher of some process
+        holds it in memory. If that process was killed before it could drain
+        (e.g. a worker hitting its time limit), nothing would ever pick the
+        row up again. Processes renew the lease of the rows they hold while
+        they keep working, so rows untouched for longer than the lease
+        timeout are considered abandoned; delivery is at least once, so a
+        row whose send was still in progress may be sent again.
+        """
+        from .cus_models import _get_webhook_config
+        
+        config = _get_webhook_config()
+        if not config:
+            return 0
+        
+        self.env.cr.execute("""
+            UPDATE webhook_log
+            SET status = 'pending',
+                next_retry_at = NULL,
+                error_message = 'Delivery interrupted, re-queued'
+            WHERE id IN (
+                SELECT id
+                FROM webhook_log
+                WHERE status IN ('queued', 'sending')
+                AND write_date < (now() at time zone 'UTC') - make_interval(secs => %s)
+                FOR UPDATE SKIP LOCKED
+            )
+        """, (config['lease_timeout'],))
+        swept = self.env.cr.rowcount
+        self.invalidate_model()
+        self.env.cr.commit()
+        
+        if swept:
+            _logger.warning(f"Re-queued {swept} stale webhooks")
+        return swept
+
+    
+    @api.model
+    def _cron_prune_logs(self, chunk_size=1000, time_budget=90):
+        """
+        Apply the retention policy of the active configuration.
+        
+        Finished logs older than their retention period are deleted in chunks
+        of ``chunk_size`` rows, committing after each chunk so the table is
+        never locked for long. Chunks are deleted until nothing is left or
+        ``time_budget`` seconds have passed, which keeps a run under the cron
+        time limit; the next hourly run continues where it stopped. With
+        archiving enabled, each chunk is first stored as a gzip-compressed
+        JSON Lines file in webhook.log.archive.
+        """
+        config = self.env['sync.app.config'].sudo().search([('active', '=', True)], limit=1)
+        if not config:
+            return
+        
+        now = fields.Datetime.now()
+        policies = [
+            # Superseded updates were replaced by a newer payload and need no longer history
+            (['success', 'superseded'], config.webhook_log_keep_success_days),
+            (['error'], config.webhook_log_keep_error_days),
+        ]
+        
+        deadline = time.monotonic() + time_budget
+        pruned = 0
+        for statuses, keep_days in policies:
+            if not keep_days:
+                continue
+            cutoff = now - timedelta(days=keep_days)
+            while time.monotonic() < deadline:
+                self.env.cr.execute("""
+                    SELECT id
+                    FROM webhook_log
+                    WHERE status IN %s
+                    AND create_date < %s
+                    ORDER BY id
+                    LIMIT %s
+                """, (tuple(statuses), cutoff, chunk_size))
+                ids = [row[0] for row in self.env.cr.fetchall()]
+                if not ids:
+                    break
+                
+                if config.webhook_log_archive:
+                    self._archive_logs(ids)
+                self.env.cr.execute("DELETE FROM webhook_log WHERE id IN %s", (tuple(ids),))
+                self.invalidate_model()
+                self.env.cr.commit()
+                pruned += len(ids)
+        
+        if pruned:
+            _logger.info(f"Pruned {pruned} webhook logs")
+        return pruned
+    
+    @api.model
+    def _archive_logs(self, ids):
+        """Store the given log rows in a compressed webhook.log.archive record"""
+        self.env.cr.execute("""
+            SELECT id, create_date, url, model, operation, record_ids, payload,
+                   payload_encoding, status, status_code, response_body,
+                   error_message, retry_count, sent_at, completed_at, duration_ms
+            FROM webhook_log
+            WHERE id IN %s
+            ORDER BY id
+        """, (tuple(ids),))
+        rows = self.env.cr.dictfetchall()
+        if not rows:
+            return
+        
+        lines = '\n'.join(json.dumps(row, separators=(',', ':'), default=str) for row in rows)
+        dates = [row['create_date'] for row in rows]
+        self.env['webhook.log.archive'].sudo().create({
+            'name': f"webhook_log {rows[0]['id']}-{rows[-1]['id']}",
+            'date_from': min(dates),
+            'date_to': max(dates),
+            'row_count': len(rows),
+            'data': base64.b64encode(gzip.compress(lines.encode())),
+            'data_fname': f"webhook_log_{rows[0]['id']}_{rows[-1]['id']}.jsonl.gz",
+        })
+
+
+class WebhookLogArchive(models.Model):
+    _name = 'webhook.log.archive'
+    _description = 'Webhook Log Archive'
+    _order = 'id desc'
+    
+    name = fields.Char(string='Reference', required=True)
+    date_from = fields.Datetime(string='From')
+    date_to = fields.Datetime(string='To')
+    row_count = fields.Integer(string='Rows')
+    data = fields.Binary(string='Archive', attachment=True,
+                         help='Gzip-compressed JSON Lines export of the archived log rows')
+    data_fname = fields.Char(string='File Name')
@@ -0,0 +1,116 @@
+# models/webhook_record_version.py
+from odoo import models, fields, api
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class WebhookRecordVersion(models.Model):
+    _name = 'webhook.record.version'
+    _description = 'Webhook Record Version'
+    _order = 'model, res_id'
+
+    model = fields.Char(string='Model', required=True, index=True)
+    res_id = fields.Integer(string='Record ID', required=True)
+    version = fields.Integer(string='Version', default=0, required=True)
+    snapshot = fields.Text(string='Last Sent Data',
+                           help='Field values of the last queued version; deltas are computed against it')
+
+    _sql_constraints = [
+        ('model_res_id_uniq', 'unique(model, res_id)', 'A record can only have one webhook version!'),
+    ]
+
+    @api.model
+    def _lock_versions(self, model, res_ids):
+        """
+        Return ``{res_id: (version, snapshot)}`` for the records, creating
+        missing rows and locking them until the end of the transaction so
+        concurrent writers of the same record get consecutive versions.
+        """
+        for res_id in res_ids:
+            self.env.cr.execute("""
+                INSERT INTO webhook_record_version (model, res_id, version, create_uid, create_date, write_uid, write_date)
+                VALUES (%s, %s, 0, %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+                ON CONFLICT (model, res_id) DO NOTHING
+            """, (model, res_id, self.env.uid, self.env.uid))
+        self.env.cr.execute("""
+            SELECT res_id, version, snapshot
+            FROM webhook_record_version
+            WHERE model = %s AND res_id IN %s
+            FOR UPDATE
+        """, (model, tuple(res_ids)))
+        return {
+            res_id: (version, json.loads(snapshot) if snapshot else None)
+            for res_id, version, snapshot in self.env.cr.fetchall()
+        }
+
+    @api.model
+    def _apply_delta(self, payload):
+        """
+        Turn a create/update payload of a single record into a versioned
+        delta, in place.
+
+        ``data`` keeps only the fields whose value differs from the last
+        queued version and the payload gets ``delta``, ``version`` and
+        ``base_version``. A receiver whose current version is not
+        ``base_version`` has missed an event and should do a full refresh.
+        Creates, and updates of records without a snapshot, are sent in full
+        with ``delta`` False.
+
+        :return: False when nothing changed and no event needs to be sent
+        """
+        model = payload.get('model')
+        res_ids = payload.get('ids') or []
+        operation = payload.get('operation')
+
+        if operation == 2:
+            if res_ids:
+                self.env.cr.execute("""
+                    DELETE FROM webhook_record_version WHERE model = %s AND res_id IN %s
+                """, (model, tuple(res_ids)))
+            return True
+        if operation not in (0, 1) or not isinstance(payload.get('data'), dict) or not res_ids:
+            return True
+
+        versions = self._lock_versions(model, res_ids)
+        if len(res_ids) > 1:
+            # The data is shared by several records: it cannot be a per-record
+            # delta, so the next change of each record is sent in full
+            self.env.cr.execute("""
+                UPDATE webhook_record_version SET snapshot = NULL WHERE model = %s AND res_id IN %s
+            """, (model, tuple(res_ids)))
+            return True
+
+        res_id = res_ids[0]
+        data = payload['data']
+        version, snapshot = versions[res_id]
+
+        if operation == 1 and snapshot is not None:
+            changed = {key: value for key, value in data.items() if key not in snapshot or snapshot[key] != value}
+            if not changed:
+                _logger.debug(f"No field changed on {model}({res_id}), skipping webhook")
+                return False
+            snapshot.update(changed)
+            payload.update({'data': changed, 'delta': True, 'base_version': version})
+        else:
+            snapshot = dict(data) if operation == 0 else dict(snapshot or {}, **data)
+            payload['delta'] = False
+
+        payload['version'] = version + 1
+        self.env.cr.execute("""
+            UPDATE webhook_record_version
+            SET version = %s, snapshot = %s, write_uid = %s, write_date = now() at time zone 'UTC'
+            WHERE model = %s AND res_id = %s
+        """, (version + 1, json.dumps(snapshot, separators=(',', ':'), default=str), self.env.uid, model, res_id))
+        return True
+
+    @api.model
+    def _get_versions(self, model, res_ids):
+        """Return ``{res_id: version}`` of the records"""
+        if not res_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT res_id, version FROM webhook_record_version WHERE model = %s AND res_id IN %s
+        """, (model, tuple(res_ids)))
+        return dict(self.env.cr.fetchall())
@@ -0,0 +1,208 @@
+# models/webhook_replay.py
+from odoo import models, fields, api
+from odoo.exceptions import UserError, ValidationError
+import logging
+
+from .webhook_log import DISPATCH_LIMIT
+
+_logger = logging.getLogger(__name__)
+
+
+class WebhookReplayJob(models.Model):
+    _name = 'webhook.replay.job'
+    _description = 'Webhook Replay Job'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True, default='Webhook Replay')
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('cancelled', 'Cancelled'),
+    ], string='State', default='draft', required=True)
+
+    # Selection of the logs to replay
+    log_status = fields.Selection([
+        ('error', 'Error'),
+        ('retrying', 'Retrying'),
+        ('superseded', 'Superseded'),
+        ('success', 'Success'),
+    ], string='Log Status', default='error', required=True)
+    model = fields.Char(string='Model', help='Only replay events of this model (empty = all)')
+    subscriber_id = fields.Many2one('webhook.subscriber', string='Subscriber', ondelete='cascade')
+    date_from = fields.Datetime(string='From')
+    date_to = fields.Datetime(string='To')
+    log_ids = fields.Many2many(
+        'webhook.log',
+        'webhook_replay_job_log_rel',
+        'job_id',
+        'log_id',
+        string='Selected Logs',
+        help='When set, only these logs are replayed'
+    )
+
+    # Throttling and progress
+    rate_per_minute = fields.Integer(
+        string='Rate (events/minute)',
+        default=DISPATCH_LIMIT,
+        help='Logs re-enqueued per minute, in id order. The scheduler dispatches '
+             f'{DISPATCH_LIMIT} webhooks per minute in all, replays included'
+    )
+    total_count = fields.Integer(string='Total', readonly=True)
+    processed_count = fields.Integer(string='Re-enqueued', readonly=True)
+    progress = fields.Float(string='Progress', compute='_compute_progress')
+    last_log_id = fields.Integer(string='Last Log ID', readonly=True,
+                                 help='Logs up to this id have been re-enqueued')
+    max_log_id = fields.Integer(string='Max Log ID', readonly=True,
+                                help='Newest log when the job started; later logs are not replayed')
+    started_at = fields.Datetime(string='Started At', readonly=True)
+    finished_at = fields.Datetime(string='Finished At', readonly=True)
+
+    # ============================================
+    # COMPUTE
+    # ============================================
+    @api.depends('total_count', 'processed_count')
+    def _compute_progress(self):
+        for record in self:
+            record.progress = 100.0 * record.processed_count / record.total_count if record.total_count else 0.0
+
+    # ============================================
+    # CONSTRAINTS
+    # ============================================
+    @api.constrains('rate_per_minute')
+    def _check_rate_per_minute(self):
+        for record in self:
+            if record.rate_per_minute < 1:
+                raise ValidationError('Replay rate must be at least 1 event per minute')
+
+    @api.constrains('date_from', 'date_to')
+    def _check_dates(self):
+        for record in self:
+            if record.date_from and record.date_to and record.date_from > record.date_to:
+                raise ValidationError('Replay start date must be before its end date')
+
+    # ============================================
+    # ACTIONS
+    # ============================================
+    def _get_log_domain(self):
+        """Domain of the logs selected by this job"""
+        self.ensure_one()
+        domain = [('status', '=', self.log_status)]
+        if self.log_ids:
+            domain.append(('id', 'in', self.log_ids.ids))
+        if self.model:
+            domain.append(('model', '=', self.model))
+        if self.subscriber_id:
+            domain.append(('subscriber_id', '=', self.subscriber_id.id))
+        if self.date_from:
+            domain.append(('create_date', '>=', self.date_from))
+        if self.date_to:
+            domain.append(('create_date', '<=', self.date_to))
+        if self.max_log_id:
+            domain.append(('id', '<=', self.max_log_id))
+        return domain
+
+    def action_start(self):
+        for job in self:
+            if job.state != 'draft':
+                raise UserError('Only draft replay jobs can be started')
+            # Logs failing after the start are not part of the job
+            job.max_log_id = self.env['webhook.log'].search([], order='id desc', limit=1).id
+            job.write({
+                'state': 'running',
+                'total_count': self.env['webhook.log'].search_count(job._get_log_domain()),
+                'processed_count': 0,
+                'last_log_id': 0,
+                'started_at': fields.Datetime.now(),
+            })
+        return True
+
+    def action_cancel(self):
+        self.filtered(lambda job: job.state in ('draft', 'running')).write({
+            'state': 'cancelled',
+            'finished_at': fields.Datetime.now(),
+        })
+        return True
+
+    @api.model
+    def action_replay_logs(self, log_ids, rate_per_minute=None):
+        """Create and start a replay job for explicitly selected logs"""
+        logs = self.env['webhook.log'].browse(log_ids).exists()
+        statuses = set(logs.mapped('status'))
+        if not logs or len(statuses) > 1 or not statuses <= {'error', 'retrying', 'superseded', 'success'}:
+            raise UserError('Select finished logs with a single status to replay')
+        vals = {
+            'name': f'Replay of {len(logs)} logs',
+            'log_status': statuses.pop(),
+            'log_ids': [(6, 0, logs.ids)],
+        }
+        if rate_per_minute:
+            vals['rate_per_minute'] = rate_per_minute
+        job = self.create(vals)
+        job.action_start()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': job.id,
+            'view_mode': 'form',
+        }
+
+    def _get_progress(self):
+        """Progress of the job as sent by the API"""
+        self.ensure_one()
+        return {
+            'id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'total': self.total_count,
+            'processed': self.processed_count,
+            'progress': round(self.progress, 2),
+            'last_log_id': self.last_log_id,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    # ============================================
+    # SCHEDULER
+    # ============================================
+    @api.model
+    def _cron_process_replays(self):
+        """
+        Re-enqueue the next slice of every running replay job.
+
+        Each run moves at most ``rate_per_minute`` logs of a job, in id order,
+        back to ``pending`` with a fresh retry budget; the regular dispatcher
+        then delivers them. The scheduler runs every minute, so the rate is
+        the number of events per minute. Updates whose record had a newer
+        event delivered since are marked superseded instead, so the replay
+        never overwrites newer data. Progress is committed per job.
+        """
+        for job in self.search([('state', '=', 'running')], order='id'):
+            logs = self.env['webhook.log'].search(
+                job._get_log_domain() + [('id', '>', job.last_log_id)],
+                order='id',
+                limit=job.rate_per_minute,
+            )
+            if logs:
+                outdated = logs._outdated_updates()
+                outdated.write({
+                    'status': 'superseded',
+                    'next_retry_at': False,
+                    'completed_at': fields.Datetime.now(),
+                })
+                (logs - outdated).write({
+                    'status': 'pending',
+                    'retry_count': 0,
+                    'next_retry_at': False,
+                    'error_message': False,
+                    'completed_at': False,
+                })
+                job.write({
+                    'processed_count': job.processed_count + len(logs),
+                    'last_log_id': logs[-1].id,
+                })
+                _logger.info(f"Replay {job.name}: re-enqueued {len(logs) - len(outdated)} webhooks, "
+                             f"{len(outdated)} outdated updates superseded")
+            if len(logs) < job.rate_per_minute:
+                job.write({'state': 'done', 'finished_at': fields.Datetime.now()})
+            self.env.cr.commit()
@@ -0,0 +1,129 @@
+# models/webhook_stats.py
+from odoo import models, fields, api
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Statuses of webhooks still waiting to be delivered
+BACKLOG_STATUSES = ('pending', 'queued', 'sending', 'retrying')
+
+
+class WebhookStats(models.Model):
+    _name = 'webhook.stats'
+    _description = 'Webhook Delivery Statistics'
+    _order = 'snapshot_at desc, dimension, key'
+    _rec_name = 'key'
+
+    snapshot_at = fields.Datetime(string='Snapshot', required=True, index=True)
+    window_minutes = fields.Integer(string='Window (minutes)')
+    dimension = fields.Selection([
+        ('url', 'URL'),
+        ('model', 'Model'),
+    ], string='Grouped By', required=True)
+    key = fields.Char(string='URL / Model', required=True)
+
+    # Deliveries attempted within the window
+    delivered_count = fields.Integer(string='Attempts', group_operator='sum')
+    success_count = fields.Integer(string='Successes', group_operator='sum')
+    failure_count = fields.Integer(string='Failures', group_operator='sum')
+    success_rate = fields.Float(string='Success Rate (%)', group_operator='avg')
+    deliveries_per_minute = fields.Float(string='Deliveries/min', group_operator='sum')
+    p50_ms = fields.Float(string='p50 (ms)', group_operator='avg')
+    p95_ms = fields.Float(string='p95 (ms)', group_operator='avg')
+    p99_ms = fields.Float(string='p99 (ms)', group_operator='avg')
+
+    # Backlog at snapshot time
+    queue_depth = fields.Integer(string='Queue Depth', group_operator='sum')
+    oldest_pending_age = fields.Integer(string='Oldest Pending (s)', group_operator='max')
+
+    @api.model
+    def _collect(self, dimension, since):
+        """Aggregate webhook.log by URL or model since ``since``"""
+        column = 'url' if dimension == 'url' else 'model'
+        self.env.cr.execute(f"""
+            SELECT
+                {column} AS key,
+                count(*) FILTER (WHERE sent_at >= %(since)s AND status IN ('success', 'error', 'retrying')) AS delivered,
+                count(*) FILTER (WHERE sent_at >= %(since)s AND status = 'success') AS succeeded,
+                count(*) FILTER (WHERE sent_at >= %(since)s AND status IN ('error', 'retrying')) AS failed,
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_ms)
+                    FILTER (WHERE sent_at >= %(since)s AND duration_ms > 0) AS p50,
+                percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_ms)
+                    FILTER (WHERE sent_at >= %(since)s AND duration_ms > 0) AS p95,
+                percentile_cont(0.99) WITHIN GROUP (ORDER BY duration_ms)
+                    FILTER (WHERE sent_at >= %(since)s AND duration_ms > 0) AS p99,
+                count(*) FILTER (WHERE status IN %(backlog)s) AS queue_depth,
+                min(create_date) FILTER (WHERE status IN %(backlog)s) AS oldest_pending
+            FROM webhook_log
+            WHERE (sent_at >= %(since)s OR status IN %(backlog)s)
+            AND url != 'CHECKPOINT'
+            GROUP BY {column}
+        """, {'since': since, 'backlog': BACKLOG_STATUSES})
+        return self.env.cr.dictfetchall()
+
+    @api.model
+    def _cron_refresh_stats(self, window_minutes=15, keep_days=7):
+        """
+        Store a snapshot of delivery latency, throughput and backlog per URL
+        and per model, computed over the last ``window_minutes``, and drop
+        snapshots older than ``keep_days``.
+        """
+        now = fields.Datetime.now()
+        since = now - timedelta(minutes=window_minutes)
+        vals_list = []
+        for dimension in ('url', 'model'):
+            for row in self._collect(dimension, since):
+                delivered = row['delivered']
+                vals_list.append({
+                    'snapshot_at': now,
+                    'window_minutes': window_minutes,
+                    'dimension': dimension,
+                    'key': row['key'] or '',
+                    'delivered_count': delivered,
+                    'success_count': row['succeeded'],
+                    'failure_count': row['failed'],
+                    'success_rate': 100.0 * row['succeeded'] / delivered if delivered else 0.0,
+                    'deliveries_per_minute': delivered / window_minutes,
+                    'p50_ms': row['p50'] or 0.0,
+                    'p95_ms': row['p95'] or 0.0,
+                    'p99_ms': row['p99'] or 0.0,
+                    'queue_depth': row['queue_depth'],
+                    'oldest_pending_age': int((now - row['oldest_pending']).total_seconds()) if row['oldest_pending'] else 0,
+                })
+        self.create(vals_list)
+
+        self.env.cr.execute(
+            "DELETE FROM webhook_stats WHERE snapshot_at < %s",
+            (now - timedelta(days=keep_days),)
+        )
+        self.invalidate_model()
+        _logger.info(f"Webhook statistics refreshed: {len(vals_list)} rows")
+
+    @api.model
+    def _get_latest(self):
+        """Rows of the latest snapshot, as sent by the API"""
+        latest = self.search([], limit=1)
+        if not latest:
+            return {'snapshot_at': None, 'url': [], 'model': []}
+        result = {'snapshot_at': latest.snapshot_at.isoformat(), 'window_minutes': latest.window_minutes}
+        rows = self.search([('snapshot_at', '=', latest.snapshot_at)])
+        for dimension in ('url', 'model'):
+            result[dimension] = [
+                {
+                    'key': row.key,
+                    'attempts': row.delivered_count,
+                    'successes': row.success_count,
+                    'failures': row.failure_count,
+                    'success_rate': round(row.success_rate, 2),
+                    'deliveries_per_minute': round(row.deliveries_per_minute, 2),
+                    'p50_ms': row.p50_ms,
+                    'p95_ms': row.p95_ms,
+                    'p99_ms': row.p99_ms,
+                    'queue_depth': row.queue_depth,
+                    'oldest_pending_age': row.oldest_pending_age,
+                }
+                for row in rows
+                if row.dimension == dimension
+            ]
+        return result
@@ -0,0 +1,93 @@
+# models/webhook_subscriber.py
+from odoo import models, fields, api
+from odoo.exceptions import ValidationError
+
+
+class WebhookSubscriber(models.Model):
+    _name = 'webhook.subscriber'
+    _description = 'Webhook Subscriber'
+    _order = 'sequence, id'
+
+    name = fields.Char(string='Name', required=True)
+    sequence = fields.Integer(string='Sequence', default=10)
+    active = fields.Boolean(string='Active', default=True)
+    config_id = fields.Many2one(
+        'sync.app.config',
+        string='Configuration',
+        required=True,
+        ondelete='cascade'
+    )
+    url = fields.Char(string='URL', required=True, help='Endpoint receiving the events')
+    auth_token = fields.Char(string='Auth Token', groups='sync_app.group_api_admin',
+                             help='Optional Bearer token for authentication')
+
+    # Filters
+    model_ids = fields.Many2many(
+        'ir.model',
+        'webhook_subscriber_ir_model_rel',
+        'subscriber_id',
+        'model_id',
+        string='Models',
+        help='Models whose events are sent to this subscriber (empty = all)'
+    )
+    send_create = fields.Boolean(string='Creations', default=True)
+    send_update = fields.Boolean(string='Updates', default=True)
+    send_delete = fields.Boolean(string='Deletions', default=True)
+
+    log_ids = fields.One2many('webhook.log', 'subscriber_id', string='Logs')
+
+    # ============================================
+    # CRUD
+    # ============================================
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records.config_id._invalidate_webhook_config()
+        return records
+
+    def write(self, vals):
+        configs = self.config_id
+        result = super().write(vals)
+        (configs | self.config_id)._invalidate_webhook_config()
+        return result
+
+    def unlink(self):
+        configs = self.config_id
+        result = super().unlink()
+        configs._invalidate_webhook_config()
+        return result
+
+    # ============================================
+    # CONSTRAINTS
+    # ============================================
+    @api.constrains('url')
+    def _check_url(self):
+        for record in self:
+            if not record.url.startswith(('http://', 'https://')):
+                raise ValidationError('Subscriber URL must start with http:// or https://')
+
+    @api.constrains('send_create', 'send_update', 'send_delete')
+    def _check_operations(self):
+        for record in self:
+            if not (record.send_create or record.send_update or record.send_delete):
+                raise ValidationError('A subscriber must receive at least one kind of event')
+
+    def _get_target_values(self):
+        """Values overriding the webhook configuration for this subscriber"""
+        self.ensure_one()
+        operations = [
+            operation
+            for operation, enabled in (
+                ('create', self.send_create),
+                ('update', self.send_update),
+                ('delete', self.send_delete),
+            )
+            if enabled
+        ]
+        return {
+            'subscriber_id': self.id,
+            'url': self.url,
+            'auth_token': self.auth_token,
+            'models': frozenset(self.model_ids.mapped('model')) or None,
+            'operations': frozenset(operations) if len(operations) < 3 else None,
+        }